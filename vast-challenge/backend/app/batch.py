@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+from contextvars import ContextVar
+from urllib.parse import urlencode
+
+# sub-requests of a batch executed at the same time
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+# paths that cannot be part of a batch (nesting, binary downloads, debugging)
+EXCLUDED_PREFIXES = ("/batch", "/export", "/debug")
+
+# set while the sub-requests of a batch are served: the batch already checked the database connection
+in_batch: ContextVar[bool] = ContextVar("in_batch", default=False)
+
+
+def _rejection(path: str) -> str | None:
+    if not path.startswith("/"):
+        return "Path must start with '/'"
+    if path.startswith(EXCLUDED_PREFIXES):
+        return f"Path '{path}' cannot be requested in a batch"
+    return None
+
+
+async def _dispatch(app, path: str, params: dict) -> dict:
+    """Serves a GET request in-process through the full ASGI app (middlewares, validation, exception handlers)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(params, doseq=True).encode(),
+        "headers": [(b"accept", b"application/json")],
+        "client": None,
+        "server": None,
+    }
+    request_sent = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    response = {"status": 500, "headers": {}, "body": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+
+    body = b"".join(response["body"])
+    if response["headers"].get("content-type", "").startswith("application/json"):
+        body = json.loads(body) if body else None
+    else:
+        body = body.decode(errors="replace")
+    return {"status": response["status"], "body": body}
+
+
+async def run_batch(app, requests: list[dict], concurrency: int = BATCH_CONCURRENCY) -> list[dict]:
+    """
+    Executes GET sub-requests (`path` plus query `params`) concurrently, at most `concurrency` at a time,
+    and returns one result per sub-request (in request order) with its HTTP status and decoded body.
+    A failing sub-request does not affect the others.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    token = in_batch.set(True)
+
+    async def _run(request: dict) -> dict:
+        path, params = request["path"], request.get("params") or {}
+        result = {"path": path, "params": params}
+        rejection = _rejection(path)
+        if rejection:
+            return {**result, "status": 400, "body": {"detail": rejection}}
+        async with semaphore:
+            try:
+                return {**result, **await _dispatch(app, path, params)}
+            except Exception as e:
+                print(f"Batch sub-request {path} failed: {e}")
+                return {**result, "status": 500, "body": {"detail": str(e)}}
+
+    try:
+        return await asyncio.gather(*(_run(request) for request in requests))
+    finally:
+        in_batch.reset(token)
@@ -0,0 +1,280 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal
+
+import numpy as np
+from neo4j import AsyncDriver
+
+from .coalescing import SingleFlight
+from .result_cache import ResultCache, data_version
+from .timeline import SentimentTimeline, sentiment_timeline
+from .utils import DATASET_BITS, LazyIndex
+
+BiasLevel = Literal["entity", "industry", "entity_industry"]
+
+BOOTSTRAP_RESAMPLES = 2000
+PERMUTATIONS = 2000
+# resamples drawn at once, bounds the memory of a batch to BATCH_SIZE x number of sentiments
+RESAMPLE_BATCH_SIZE = 500
+# groups (entities, industries, ...) per task of the process pool
+GROUPS_PER_TASK = 16
+# sentiments x (resamples + permutations) below which the statistics are computed in the calling thread:
+# starting worker processes costs more than it saves for smaller jobs (the real data is far below it)
+PARALLEL_MIN_DRAWS = 100_000_000
+# memory budget of the cached results (levels and resampling parameters are client input)
+BIAS_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _segments(counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Start of every segment of consecutive values and the segment of every value."""
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    return starts, np.repeat(np.arange(len(counts)), counts)
+
+
+def bootstrap_means(values: np.ndarray, members: np.ndarray, counts: np.ndarray, resamples: int,
+                    rng: np.random.Generator) -> np.ndarray:
+    """
+    Bootstrap distributions of the means of several samples stored as consecutive segments of `values`
+    (`counts` values each): all samples are resampled with replacement at once, in batches of resamples. Every
+    row of `members` selects a subset of the values (e.g. a dataset view) whose mean is taken within the same
+    resamples, so differences between subsets are paired. Returns subsets x resamples x samples, NaN where a
+    resample contains no value of a subset.
+    """
+    means = np.full((len(members), resamples, len(counts)), np.nan)
+    nonempty = counts > 0
+    if not nonempty.any():
+        return means
+    starts, segment_of = _segments(counts)
+    for first in range(0, resamples, RESAMPLE_BATCH_SIZE):
+        batch = min(RESAMPLE_BATCH_SIZE, resamples - first)
+        picks = starts[segment_of] + (rng.random((batch, len(values))) * counts[segment_of]).astype(np.int64)
+        picked = values[picks]
+        for s, member in enumerate(members):
+            selected = member[picks]
+            sums = np.add.reduceat(picked * selected, starts[nonempty], axis=1)
+            sizes = np.add.reduceat(selected, starts[nonempty], axis=1, dtype=np.int64)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means[s, first:first + batch, nonempty] = (sums / sizes).T
+    return means
+
+
+def permutation_differences(values: np.ndarray, counts: np.ndarray, num_first: np.ndarray, shared_sums: np.ndarray,
+                            shared_counts: np.ndarray, permutations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Permutation distributions of the difference of two means per group. The values of every group that belong
+    to only one of the two samples (consecutive segments of `values`, the first `num_first` of them to the first
+    sample) are shuffled between the samples within their group, the values belonging to both samples
+    (`shared_sums`/`shared_counts`) stay in both. Returns permutations x groups (NaN for groups with an empty sample).
+    """
+    num_second = counts - num_first
+    differences = np.empty((permutations, len(counts)))
+    nonempty = counts > 0
+    starts, segment_of = _segments(counts)
+    in_first = (np.arange(len(values)) - starts[segment_of]) < num_first[segment_of]
+    totals = np.bincount(segment_of, weights=values, minlength=len(counts))
+    for first in range(0, permutations, RESAMPLE_BATCH_SIZE):
+        batch = min(RESAMPLE_BATCH_SIZE, permutations - first)
+        # random order within every segment: the segment number dominates the sort key
+        order = np.argsort(rng.random((batch, len(values))) + segment_of, axis=1)
+        first_sums = np.zeros((batch, len(counts)))
+        if nonempty.any():
+            first_sums[:, nonempty] = np.add.reduceat(values[order] * in_first, starts[nonempty], axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            differences[first:first + batch] = (
+                (shared_sums + first_sums) / (shared_counts + num_first)
+                - (shared_sums + totals - first_sums) / (shared_counts + num_second)
+            )
+    return differences
+
+
+def permutation_test(values: np.ndarray, segment_of: np.ndarray, num_groups: int, first: np.ndarray,
+                     second: np.ndarray, permutations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Two-sided p-value per group for the difference of the means of two (possibly overlapping) samples of the
+    group's values, selected by the boolean arrays `first` and `second`. NaN where a sample is empty.
+    """
+    shared, only_first, only_second = first & second, first & ~second, second & ~first
+    exclusive = only_first | only_second
+    # exclusive values of every group with those of the first sample first
+    order = np.lexsort((~only_first[exclusive], segment_of[exclusive]))
+    shared_sums = np.bincount(segment_of[shared], weights=values[shared], minlength=num_groups)
+    shared_counts = np.bincount(segment_of[shared], minlength=num_groups)
+    num_first = np.bincount(segment_of[only_first], minlength=num_groups)
+    num_second = np.bincount(segment_of[only_second], minlength=num_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        observed = (
+            (shared_sums + np.bincount(segment_of[only_first], weights=values[only_first], minlength=num_groups))
+            / (shared_counts + num_first)
+            - (shared_sums + np.bincount(segment_of[only_second], weights=values[only_second], minlength=num_groups))
+            / (shared_counts + num_second)
+        )
+    permuted = permutation_differences(values[exclusive][order], num_first + num_second, num_first, shared_sums,
+                                       shared_counts, permutations, rng)
+    # tolerance: permutations reproducing the observed split must count despite rounding
+    extreme = (np.abs(permuted) >= np.abs(observed) - 1e-9).sum(axis=0)
+    return np.where(np.isnan(observed), np.nan, (1 + extreme) / (1 + permutations))
+
+
+def _percentiles(distributions: np.ndarray, alpha: float) -> np.ndarray:
+    """Percentile interval per column, ignoring NaN (resamples without values), NaN for empty columns."""
+    intervals = np.full((distributions.shape[1], 2), np.nan)
+    defined = ~np.isnan(distributions).all(axis=0)
+    if defined.any():
+        intervals[defined] = np.nanquantile(distributions[:, defined], [alpha, 1 - alpha], axis=0).T
+    return intervals
+
+
+def _group_statistics(values: np.ndarray, masks: np.ndarray, counts: np.ndarray, resamples: int, permutations: int,
+                      confidence: float, seed: np.random.SeedSequence) -> dict[str, np.ndarray]:
+    """
+    Statistics of groups of sentiments (consecutive segments of `values`, `counts` each, with their dataset
+    membership `masks`): per dataset view the mean sentiment with its bootstrap interval, per partial view the
+    deviation from the full record (`jo`) and the difference FILAH - TROUT, with intervals and p-values.
+    """
+    rng = np.random.default_rng(seed)
+    _, segment_of = _segments(counts)
+    alpha = (1 - confidence) / 2
+    num_groups = len(counts)
+    members = {view: (masks & bit) != 0 for view, bit in DATASET_BITS.items()}
+    bootstrapped = dict(zip(members, bootstrap_means(values, np.stack(list(members.values())), counts, resamples, rng)))
+    result = {}
+    for view, member in members.items():
+        result[f"{view}_n"] = np.bincount(segment_of[member], minlength=num_groups)
+        sums = np.bincount(segment_of[member], weights=values[member], minlength=num_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[f"{view}_score"] = sums / result[f"{view}_n"]
+        result[f"{view}_ci"] = _percentiles(bootstrapped[view], alpha)
+
+    comparisons = {f"{view}_bias": (view, "jo") for view in members if view != "jo"}
+    comparisons["fi_minus_tr"] = ("fi", "tr")
+    for name, (first, second) in comparisons.items():
+        result[name] = result[f"{first}_score"] - result[f"{second}_score"]
+        result[f"{name}_ci"] = _percentiles(bootstrapped[first] - bootstrapped[second], alpha)
+        if second == "jo":
+            # a view is part of the full record: its deviation is tested against the rest of the record
+            # (the same statistic up to a constant factor per group), no rest means no deviation
+            p_values = permutation_test(values, segment_of, num_groups, members[first],
+                                        members["jo"] & ~members[first], permutations, rng)
+            result[f"{name}_p"] = np.where(np.isnan(p_values) & ~np.isnan(result[name]), 1.0, p_values)
+        else:
+            result[f"{name}_p"] = permutation_test(
+                values, segment_of, num_groups, members[first], members[second], permutations, rng)
+    return result
+
+
+def _value(x) -> float | None:
+    return None if np.isnan(x) else round(float(x), 4)
+
+
+def _comparison(stats: dict[str, np.ndarray], name: str, g: int) -> dict:
+    return {
+        "difference": _value(stats[name][g]),
+        "ci": [_value(v) for v in stats[f"{name}_ci"][g]],
+        "p_value": _value(stats[f"{name}_p"][g]),
+    }
+
+
+class BiasStatistics:
+    """
+    Bias scores (mean sentiment) of entities, industries or entities per industry in every dataset view, with
+    bootstrap confidence intervals and permutation-test p-values telling whether a view's picture is more than
+    noise: how far the FILAH and TROUT views deviate from the full record (`jo`) they were drawn from, and how
+    far they differ from each other.
+
+    Sentiments are the statements counted by the pro/contra and industry aggregations (see `timeline`).
+    Resampling is vectorized over all groups, large jobs are spread over a pool of (spawned) processes. Results
+    are cached per data version and parameters, least recently used ones evicted beyond a memory budget.
+    """
+
+    def __init__(self, timeline: SentimentTimeline):
+        self.timeline = timeline
+        self._cache = ResultCache("bias-statistics", max_bytes=BIAS_CACHE_MAX_BYTES)
+        self._flights = SingleFlight("bias-statistics")
+        self._version: tuple | None = None
+
+    def _groups(self, level: BiasLevel) -> tuple[list[tuple], np.ndarray, np.ndarray, np.ndarray]:
+        samples = {}
+        for statement in self.timeline.statements:
+            sentiment = statement["topic_sentiment"]
+            industries = [None] if level == "entity" else sentiment["topic_industry"]
+            for industry in industries:
+                key = (None if level == "industry" else statement["entity_id"], industry)
+                samples.setdefault(key, []).append((sentiment["sentiment"], sentiment["sentiment_mask"]))
+        keys = list(samples)
+        values = np.array([v for key in keys for v, _ in samples[key]], dtype=float)
+        masks = np.array([m for key in keys for _, m in samples[key]], dtype=np.int8)
+        counts = np.array([len(samples[key]) for key in keys], dtype=np.int64)
+        return keys, values, masks, counts
+
+    def _compute(self, level: BiasLevel, resamples: int, permutations: int, confidence: float, seed: int,
+                 processes: int | None = None) -> list[dict]:
+        keys, values, masks, counts = self._groups(level)
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        tasks = []
+        for first in range(0, len(keys), GROUPS_PER_TASK):
+            last = min(first + GROUPS_PER_TASK, len(keys))
+            segment = slice(bounds[first], bounds[last])
+            tasks.append((values[segment], masks[segment], counts[first:last]))
+        seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+        processes = processes or os.cpu_count() or 1
+        if processes == 1 or len(tasks) <= 1 or len(values) * (resamples + permutations) < PARALLEL_MIN_DRAWS:
+            partials = [
+                _group_statistics(*task, resamples, permutations, confidence, task_seed)
+                for task, task_seed in zip(tasks, seeds)
+            ]
+        else:
+            # spawned, not forked: forking the multi-threaded server process may deadlock
+            with ProcessPoolExecutor(max_workers=min(processes, len(tasks)),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                partials = list(pool.map(
+                    _group_statistics, *zip(*tasks),
+                    [resamples] * len(tasks), [permutations] * len(tasks), [confidence] * len(tasks), seeds
+                ))
+        stats = {name: np.concatenate([p[name] for p in partials]) for name in partials[0]} if partials else {}
+        results = []
+        for g, (entity_id, industry) in enumerate(keys):
+            views = {}
+            for view in DATASET_BITS:
+                views[view] = {
+                    "n": int(stats[f"{view}_n"][g]),
+                    "score": _value(stats[f"{view}_score"][g]),
+                    "ci": [_value(v) for v in stats[f"{view}_ci"][g]],
+                }
+                if view != "jo":
+                    views[view]["bias"] = _comparison(stats, f"{view}_bias", g)
+            results.append({
+                "entity_id": entity_id,
+                "industry": industry,
+                "views": views,
+                "fi_minus_tr": _comparison(stats, "fi_minus_tr", g),
+            })
+        print(f"Computed bias statistics of {len(results)} groups ({level}) with {resamples} resamples")
+        return results
+
+    async def statistics(self, driver: AsyncDriver, level: BiasLevel = "entity_industry",
+                         resamples: int = BOOTSTRAP_RESAMPLES, permutations: int = PERMUTATIONS,
+                         confidence: float = 0.95, seed: int = 0) -> list[dict]:
+        """Statistics of all groups of a level, computed in a worker thread (once for concurrent identical requests)."""
+        version = await data_version.current(driver)
+        if version != self._version:
+            self._cache.clear()
+            self._version = version
+        key = (version, level, resamples, permutations, confidence, seed)
+        hit, result = self._cache.get(key)
+        if not hit:
+            result = await self._flights.do(key, lambda: self._compute_and_cache(key))
+        return result
+
+    async def _compute_and_cache(self, key: tuple) -> list[dict]:
+        result = await asyncio.to_thread(self._compute, *key[1:])
+        self._cache.put(key, result)
+        return result
+
+
+async def build_bias_statistics(driver: AsyncDriver) -> BiasStatistics:
+    return BiasStatistics(await sentiment_timeline.get(driver))
+
+
+bias_statistics = LazyIndex("bias-statistics", build_bias_statistics)
@@ -0,0 +1,80 @@
+import asyncio
+import functools
+import json
+from typing import Any, Awaitable, Callable, Hashable
+
+from neo4j import AsyncDriver
+
+
+def canonical_params(params: dict | None) -> str:
+    """Order independent, hashable representation of query or endpoint parameters."""
+    return json.dumps(params or {}, sort_keys=True, default=str)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into a single execution.
+
+    The first caller for a key starts the work as a separate task; every caller arriving while
+    that task is still running awaits the same task instead of starting its own. The task is only
+    cancelled once all of its callers have gone away, so one cancelled caller does not fail the others.
+    NOTE: all callers receive the very same result object, which must therefore be treated as read-only.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: dict[Hashable, tuple[asyncio.Task, list[int]]] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        if key in self._in_flight:
+            task, waiters = self._in_flight[key]
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            waiters = [0]
+            self._in_flight[key] = (task, waiters)
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if waiters[0] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+    def stats(self) -> dict:
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": round(coalesced / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+query_flights = SingleFlight("queries")
+endpoint_flights = SingleFlight("endpoints")
+
+
+def coalesce_endpoint(endpoint: Callable[..., Awaitable[Any]]):
+    """
+    Decorator for endpoints whose response only depends on their parameters: identical
+    concurrent requests share a single execution of the endpoint (query and transform).
+    The driver dependency is not part of the key.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        params = {k: v for k, v in kwargs.items() if not isinstance(v, AsyncDriver)}
+        key = (endpoint.__qualname__, canonical_params(params))
+        return await endpoint_flights.do(key, lambda: endpoint(*args, **kwargs))
+    return wrapper
+
+
+def coalescing_metrics() -> dict:
+    return {flight.name: flight.stats() for flight in (query_flights, endpoint_flights)}
@@ -0,0 +1,202 @@
+import asyncio
+from collections import Counter
+from typing import Literal
+
+import numpy as np
+from neo4j import AsyncDriver
+
+from .coalescing import SingleFlight
+from .communities import CommunityDetector, community_detector
+from .graph_analytics import GraphArrays, GraphView, graph_arrays
+from .result_cache import ResultCache, estimate_size
+from .utils import DATASET_BITS, LazyIndex
+
+CoarseGrouping = Literal["label", "meeting", "place", "community"]
+
+# supernodes beyond this number (the smallest groups) are merged into a single `other` supernode,
+# so the overview payload does not grow with the graph
+MAX_SUPERNODES = 40
+OTHER_SUPERNODE = "other"
+# memory budget of the cached coarse graphs (one per view, grouping and max supernodes)
+COARSENING_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+class CoarseGraph:
+    """
+    Overview of a graph view with its nodes collapsed into supernodes by a grouping:
+    - `label`: one supernode per node label
+    - `meeting`: one supernode per meeting with the plans/discussions that are part of it, other nodes by label
+    - `place`: one supernode per zone with its places and the trips mostly visiting it, other nodes by label
+    - `community`: one supernode per community of `/communities` (given as node id -> community), isolated
+      nodes by label
+
+    Supernodes carry their size, label counts and dataset membership counts, superedges the number of links
+    between the members of two supernodes. The expansion of every supernode into its members (with the links
+    among them and the aggregated links to the other supernodes) is precomputed, too.
+    """
+
+    def __init__(self, graph: GraphArrays, view: GraphView, grouping: CoarseGrouping, max_supernodes: int = MAX_SUPERNODES,
+                 communities: dict | None = None):
+        self.graph = graph
+        nodes = graph.view_nodes(view)
+        links = graph.view_links(view)
+        keys = self._group_keys(nodes, links, grouping, communities or {})
+
+        # keep the largest groups, merge the rest
+        sizes = Counter(keys)
+        kept = {key for key, _ in sizes.most_common(max_supernodes - 1)} if len(sizes) > max_supernodes else set(sizes)
+        keys = [key if key in kept else OTHER_SUPERNODE for key in keys]
+        self.supernode_ids, group_of_node = np.unique(np.array(keys, dtype=object), return_inverse=True)
+        group_of_node = group_of_node.ravel()
+        self.group = np.full(len(graph), -1)
+        self.group[nodes] = group_of_node
+
+        source_groups, target_groups = self.group[graph.sources[links]], self.group[graph.targets[links]]
+        self.supernodes = []
+        for g, supernode_id in enumerate(self.supernode_ids):
+            members = nodes[group_of_node == g]
+            masks = graph.node_masks[members]
+            self.supernodes.append({
+                "id": supernode_id,
+                "size": len(members),
+                "labels": dict(Counter(graph.labels[members]).most_common()),
+                "membership": {dataset: int(((masks & bit) != 0).sum()) for dataset, bit in DATASET_BITS.items()},
+                "internal_links": int(((source_groups == g) & (target_groups == g)).sum()),
+            })
+
+        low, high = np.minimum(source_groups, target_groups), np.maximum(source_groups, target_groups)
+        between = low != high
+        pairs, counts = np.unique(np.stack([low[between], high[between]], axis=1), axis=0, return_counts=True)
+        self.superedges = [
+            {"source": self.supernode_ids[a], "target": self.supernode_ids[b], "weight": int(w)}
+            for (a, b), w in zip(pairs.reshape(-1, 2), counts)
+        ]
+        self.expansions = self._expansions(nodes, group_of_node, links, source_groups, target_groups)
+
+    def _group_keys(self, nodes: np.ndarray, links: np.ndarray, grouping: CoarseGrouping, communities: dict) -> list[str]:
+        graph = self.graph
+        keys = {node: f"label:{graph.labels[node]}" for node in nodes}
+        sources, targets, rel_types = graph.sources[links], graph.targets[links], graph.rel_types[links]
+
+        if grouping == "meeting":
+            for node in nodes:
+                if graph.labels[node] == "MEETING":
+                    keys[node] = f"meeting:{graph.ids[node]}"
+            part_of = rel_types == "PART_OF"
+            for a, b in zip(sources[part_of], targets[part_of]):
+                for member, meeting in ((a, b), (b, a)):
+                    if graph.labels[meeting] == "MEETING" and graph.labels[member] != "MEETING":
+                        keys[member] = f"meeting:{graph.ids[meeting]}"
+        elif grouping == "place":
+            for node in nodes:
+                if graph.labels[node] == "PLACE":
+                    keys[node] = f"zone:{graph.zones[node]}"
+            visits = {}
+            for a, b in zip(sources, targets):
+                for trip, place in ((a, b), (b, a)):
+                    if graph.labels[trip] == "TRIP" and graph.labels[place] == "PLACE":
+                        visits.setdefault(trip, Counter())[graph.zones[place]] += 1
+            for trip, zones in visits.items():
+                keys[trip] = f"zone:{zones.most_common(1)[0][0]}"
+        elif grouping == "community":
+            for node in nodes:
+                if graph.ids[node] in communities:
+                    keys[node] = f"community:{communities[graph.ids[node]]}"
+        return [keys[node] for node in nodes]
+
+    def _expansions(self, nodes: np.ndarray, group_of_node: np.ndarray, links: np.ndarray,
+                    source_groups: np.ndarray, target_groups: np.ndarray) -> dict[str, dict]:
+        """
+        Expansion of every supernode. Members, internal links and the links crossing supernodes are sorted by
+        supernode once, so every expansion is a slice; crossing links are counted per (supernode, member, other
+        supernode) in a single `np.unique`.
+        """
+        graph = self.graph
+        num_groups = len(self.supernode_ids)
+        member_order = np.argsort(group_of_node, kind="stable")
+        member_bounds = np.searchsorted(group_of_node[member_order], np.arange(num_groups + 1))
+
+        internal = source_groups == target_groups
+        internal_order = np.argsort(source_groups[internal], kind="stable")
+        internal_links, internal_groups = links[internal][internal_order], source_groups[internal][internal_order]
+        internal_bounds = np.searchsorted(internal_groups, np.arange(num_groups + 1))
+
+        # every crossing link from both of its ends: (group, member, other group)
+        crossing = ~internal
+        sources, targets = graph.sources[links][crossing], graph.targets[links][crossing]
+        triples = np.stack([
+            np.concatenate([source_groups[crossing], target_groups[crossing]]),
+            np.concatenate([sources, targets]),
+            np.concatenate([target_groups[crossing], source_groups[crossing]]),
+        ], axis=1)
+        triples, weights = np.unique(triples.reshape(-1, 3), axis=0, return_counts=True)
+        external_bounds = np.searchsorted(triples[:, 0], np.arange(num_groups + 1))
+
+        expansions = {}
+        for g, supernode_id in enumerate(self.supernode_ids):
+            members = nodes[member_order[member_bounds[g]:member_bounds[g + 1]]]
+            external = slice(external_bounds[g], external_bounds[g + 1])
+            expansions[supernode_id] = {
+                "nodes": [
+                    {"id": graph.ids[n], "type": graph.labels[n], "in_graph_mask": int(graph.node_masks[n])}
+                    for n in members
+                ],
+                "edges": [
+                    {"source": graph.ids[graph.sources[l]], "target": graph.ids[graph.targets[l]], "type": graph.rel_types[l]}
+                    for l in internal_links[internal_bounds[g]:internal_bounds[g + 1]]
+                ],
+                "external_edges": [
+                    {"source": graph.ids[member], "target": self.supernode_ids[other], "weight": int(weight)}
+                    for (_, member, other), weight in zip(triples[external], weights[external])
+                ],
+            }
+        return expansions
+
+    def __sizeof__(self) -> int:
+        # lets caches bounded by `estimate_size` account for the payloads
+        return estimate_size((self.supernodes, self.superedges, self.expansions))
+
+    def overview(self) -> dict:
+        return {"nodes": self.supernodes, "edges": self.superedges}
+
+    def expand(self, supernode_id: str) -> dict:
+        """Members of a supernode with their links; raises KeyError for unknown supernodes."""
+        return self.expansions[supernode_id]
+
+
+class GraphCoarsening:
+    """
+    Coarse graphs per (view, grouping, max supernodes), built in a worker thread (once for concurrent identical
+    requests) and cached, least recently used ones evicted beyond a memory budget. The `community` grouping uses
+    the (cached) partition of `/communities`.
+    """
+
+    def __init__(self, graph: GraphArrays, detector: CommunityDetector):
+        self.graph = graph
+        self.detector = detector
+        self._cache = ResultCache("coarsening", max_bytes=COARSENING_CACHE_MAX_BYTES)
+        self._flights = SingleFlight("coarsening")
+
+    async def coarse_graph(self, view: GraphView, grouping: CoarseGrouping, max_supernodes: int = MAX_SUPERNODES) -> CoarseGraph:
+        key = (view, grouping, max_supernodes)
+        hit, coarse = self._cache.get(key)
+        if not hit:
+            coarse = await self._flights.do(key, lambda: self._build_and_cache(key))
+        return coarse
+
+    async def _build_and_cache(self, key: tuple) -> CoarseGraph:
+        view, grouping, max_supernodes = key
+        communities = None
+        if grouping == "community":
+            partition = await self.detector.communities(view)
+            communities = {node["id"]: node["community"] for node in partition["nodes"]}
+        coarse = await asyncio.to_thread(CoarseGraph, self.graph, view, grouping, max_supernodes, communities)
+        self._cache.put(key, coarse)
+        return coarse
+
+
+async def build_graph_coarsening(driver: AsyncDriver) -> GraphCoarsening:
+    return GraphCoarsening(await graph_arrays.get(driver), await community_detector.get(driver))
+
+
+graph_coarsening = LazyIndex("coarsening", build_graph_coarsening)
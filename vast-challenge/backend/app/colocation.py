@@ -0,0 +1,108 @@
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+from neo4j import AsyncDriver
+
+from .crud import query_and_results
+from .result_cache import ResultCache
+from .utils import LazyIndex, convert, in_dataset
+
+
+_EPOCH = datetime(1970, 1, 1)
+# memory budget of the cached results (the window is client input, so their number is not bounded)
+COLOCATION_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+class ColocationEngine:
+    """
+    Finds persons that visited the same place within a time window of each other.
+
+    All TRIP-[VISIT]-PLACE visits are sorted by (place, time) once. A query then sweeps over
+    the sorted visits keeping a window of the visits at the current place that are at most
+    `window` seconds older than the current one, so only actually overlapping presences are compared.
+    Results are cached per (window, dataset), least recently used ones evicted beyond a memory budget.
+    """
+
+    def __init__(self, visits: list[dict]):
+        visits = sorted(visits, key=lambda v: (str(v["place_id"]), v["time"]))
+        self.visits = visits
+        self.places = np.array([str(v["place_id"]) for v in visits])
+        self.seconds = np.array([(v["time"] - _EPOCH).total_seconds() for v in visits], dtype=np.int64)
+        self._cache = ResultCache("co-locations", max_bytes=COLOCATION_CACHE_MAX_BYTES)
+
+    def _in_dataset(self, visit: dict, dataset: str | None) -> bool:
+        if dataset is None:
+            return True
+        return in_dataset(visit["took_mask"] & visit["visit_mask"], dataset)
+
+    def find(self, window_minutes: int, dataset: str | None = None) -> list[dict]:
+        key = (window_minutes, dataset)
+        hit, results = self._cache.get(key)
+        if not hit:
+            results = self._sweep(window_minutes * 60, dataset)
+            self._cache.put(key, results)
+        return results
+
+    def _sweep(self, window: int, dataset: str | None) -> list[dict]:
+        pairs = {}
+        active: deque[int] = deque()
+        current_place = None
+        for idx, visit in enumerate(self.visits):
+            if not self._in_dataset(visit, dataset):
+                continue
+            if self.places[idx] != current_place:
+                current_place = self.places[idx]
+                active.clear()
+            while active and self.seconds[active[0]] < self.seconds[idx] - window:
+                active.popleft()
+            for other_idx in active:
+                other = self.visits[other_idx]
+                if other["person_id"] == visit["person_id"]:
+                    continue
+                first, second = sorted((other, visit), key=lambda v: str(v["person_id"]))
+                pair_key = (first["person_id"], second["person_id"], visit["place_id"])
+                if pair_key not in pairs:
+                    pairs[pair_key] = {
+                        "person_a": first["person_id"],
+                        "person_b": second["person_id"],
+                        "place_id": visit["place_id"],
+                        "place_name": visit["place_name"],
+                        "encounters": [],
+                    }
+                pairs[pair_key]["encounters"].append({
+                    "time_a": first["time"],
+                    "time_b": second["time"],
+                    "trip_a": first["trip_id"],
+                    "trip_b": second["trip_id"],
+                    "gap_minutes": round(abs(int(self.seconds[idx] - self.seconds[other_idx])) / 60, 1),
+                })
+            active.append(idx)
+
+        results = list(pairs.values())
+        for result in results:
+            result["num_encounters"] = len(result["encounters"])
+        results.sort(key=lambda r: r["num_encounters"], reverse=True)
+        return results
+
+
+async def build_colocation_engine(driver: AsyncDriver) -> ColocationEngine:
+    query = """
+        MATCH (p:ENTITY_PERSON)-[took:TOOK]-(t:TRIP)-[v:VISIT]-(pl:PLACE)
+        WHERE v.time IS NOT NULL
+        RETURN p.id as person_id, t.id as trip_id, pl.id as place_id,
+            coalesce(pl.name, pl.label) as place_name, v.time as time,
+            took.in_graph_mask as took_mask, v.in_graph_mask as visit_mask
+    """
+    records = await query_and_results(driver, query, cache=False)
+    visits = []
+    for record in records:
+        visit = dict(record)
+        visit["time"] = convert(visit["time"])
+        if isinstance(visit["time"], datetime):  # unparseable times are stored as strings
+            visits.append(visit)
+    print(f"Built co-location engine over {len(visits)} visits")
+    return ColocationEngine(visits)
+
+
+colocation_engine = LazyIndex("colocation", build_colocation_engine)
@@ -0,0 +1,104 @@
+import json
+from typing import Iterable, Literal
+
+from neo4j import AsyncResult
+from neo4j.graph import Graph, Node, Relationship
+
+from .utils import DATASET_BITS, convert
+
+GraphFormat = Literal["rows", "columnar"]
+
+# properties stored in dedicated columns
+_COLUMN_PROPERTIES = {"id", "in_graph", "in_graph_mask"}
+
+
+def _node_id(node: Node):
+    return node.get("id", node.element_id)
+
+
+def _property_columns(elements: list) -> dict[str, dict]:
+    """
+    One dictionary encoded column per property key appearing on any element: the distinct values of the
+    property and, per element, the position of its value among them (-1 if the element lacks the property).
+    """
+    columns: dict[str, dict] = {}
+    for i, element in enumerate(elements):
+        for key, value in element.items():
+            if key in _COLUMN_PROPERTIES:
+                continue
+            if key not in columns:
+                columns[key] = {"lookup": {}, "values": [], "codes": [-1] * len(elements)}
+            column = columns[key]
+            value = convert(value)
+            hashable = json.dumps(value, default=str, sort_keys=True)
+            if hashable not in column["lookup"]:
+                column["lookup"][hashable] = len(column["values"])
+                column["values"].append(value)
+            column["codes"][i] = column["lookup"][hashable]
+    return {key: {"values": column["values"], "codes": column["codes"]} for key, column in columns.items()}
+
+
+def _interned(values: list) -> tuple[list, list[int]]:
+    lookup = {}
+    codes = [lookup.setdefault(v, len(lookup)) for v in values]
+    return list(lookup), codes
+
+
+def columnar_graph(nodes: Iterable[Node], relationships: Iterable[Relationship]) -> dict:
+    """
+    Serializes nodes and relationships in the columnar graph format:
+    - `nodes`: a table of columns (`id`, `label`, `in_graph_mask`, `properties`), one entry per node
+    - `edges`: columns with `source`/`target` as positions in the node table, `type`, `in_graph_mask`, `properties`
+    - `properties`: per property key its distinct `values` and one code per element into them (-1: not set)
+    - `labels`/`types`: the interned node labels and relationship types the `label`/`type` codes refer to
+    - `memberships`: the datasets encoded by every `in_graph_mask` occurring in the payload
+
+    Endpoints of relationships that are not among `nodes` are appended to the node table and flagged
+    in the `context` column (present only if there are such nodes).
+    """
+    nodes = list({node.element_id: node for node in nodes}.values())
+    relationships = list(relationships)
+    position = {node.element_id: i for i, node in enumerate(nodes)}
+    num_requested = len(nodes)
+    for relationship in relationships:
+        for node in (relationship.start_node, relationship.end_node):
+            if node.element_id not in position:
+                position[node.element_id] = len(nodes)
+                nodes.append(node)
+
+    labels, label_codes = _interned([next(iter(node.labels), None) for node in nodes])
+    types, type_codes = _interned([relationship.type for relationship in relationships])
+    node_masks = [node.get("in_graph_mask") for node in nodes]
+    edge_masks = [relationship.get("in_graph_mask") for relationship in relationships]
+
+    node_table = {
+        "id": [_node_id(node) for node in nodes],
+        "label": label_codes,
+        "in_graph_mask": node_masks,
+        "properties": _property_columns(nodes),
+    }
+    if len(nodes) > num_requested:
+        node_table["context"] = [i >= num_requested for i in range(len(nodes))]
+
+    return {
+        "format": "columnar",
+        "labels": labels,
+        "types": types,
+        "memberships": {
+            str(mask): [dataset for dataset, bit in DATASET_BITS.items() if mask & bit]
+            for mask in sorted({m for m in node_masks + edge_masks if m is not None})
+        },
+        "nodes": node_table,
+        "edges": {
+            "source": [position[r.start_node.element_id] for r in relationships],
+            "target": [position[r.end_node.element_id] for r in relationships],
+            "type": type_codes,
+            "in_graph_mask": edge_masks,
+            "properties": _property_columns(relationships),
+        },
+    }
+
+
+async def columnar_graph_transformer(result: AsyncResult):
+    graph: Graph = await result.graph()
+    return columnar_graph(graph._nodes.values(), graph._relationships.values())
@@ -0,0 +1,178 @@
+import asyncio
+from typing import Literal
+
+import numpy as np
+import scipy.sparse as sp
+from neo4j import AsyncDriver
+
+from .coalescing import SingleFlight
+from .graph_analytics import DatasetView, GraphArrays, graph_arrays
+from .projection import CoParticipationProjection, co_participation
+from .result_cache import ResultCache
+from .utils import LazyIndex, in_dataset
+
+CommunityProjection = Literal["entity_topic", "co_participation"]
+
+# resolutions are rounded to this many decimals, so nearly equal ones share a cached result
+RESOLUTION_DECIMALS = 2
+MAX_RESOLUTION = 10.0
+# memory budget of the cached partitions (relationship types and resolution are client input)
+COMMUNITY_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+def modularity(matrix: sp.csr_matrix, communities: np.ndarray, resolution: float = 1.0) -> float:
+    """Modularity of a partition of an undirected weighted graph given as symmetric adjacency matrix."""
+    total = matrix.sum()
+    if total == 0:
+        return 0.0
+    membership = sp.csr_matrix((np.ones(len(communities)), (np.arange(len(communities)), communities)))
+    internal = (membership.T @ matrix @ membership).diagonal()
+    degrees = np.asarray(membership.T @ matrix.sum(axis=1)).ravel()
+    return float((internal / total - resolution * (degrees / total) ** 2).sum())
+
+
+def _local_moving(matrix: sp.csr_matrix, resolution: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    First Louvain phase: nodes are visited in random order and moved to the neighboring community
+    with the largest modularity gain until no move improves the modularity.
+    """
+    n = matrix.shape[0]
+    total = matrix.sum()
+    degrees = np.asarray(matrix.sum(axis=1)).ravel()
+    communities = np.arange(n)
+    community_degrees = degrees.copy()
+    indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+    moved = True
+    while moved:
+        moved = False
+        for node in rng.permutation(n):
+            current = communities[node]
+            links_to = {}
+            for j, w in zip(indices[indptr[node]:indptr[node + 1]], data[indptr[node]:indptr[node + 1]]):
+                if j != node:
+                    links_to[communities[j]] = links_to.get(communities[j], 0.0) + w
+            community_degrees[current] -= degrees[node]
+            scale = resolution * degrees[node] / total
+            best, best_gain = current, links_to.get(current, 0.0) - scale * community_degrees[current]
+            for community, weight in links_to.items():
+                gain = weight - scale * community_degrees[community]
+                if gain > best_gain + 1e-12:
+                    best, best_gain = community, gain
+            community_degrees[best] += degrees[node]
+            if best != current:
+                communities[node] = best
+                moved = True
+    return np.unique(communities, return_inverse=True)[1].ravel()
+
+
+def louvain(matrix: sp.csr_matrix, resolution: float = 1.0, seed: int = 0) -> np.ndarray:
+    """
+    Louvain modularity optimization on a symmetric sparse adjacency matrix: local moving of nodes,
+    then aggregation of the communities into single nodes, repeated until the partition is stable.
+    Higher `resolution` yields smaller communities. Seeded, so results are reproducible.
+    Returns the community of every node, numbered by decreasing community size.
+    """
+    n = matrix.shape[0]
+    communities = np.arange(n)
+    if n == 0 or matrix.sum() == 0:
+        return communities
+    rng = np.random.default_rng(seed)
+    aggregated = matrix
+    while True:
+        level = _local_moving(aggregated, resolution, rng)
+        if level.max() + 1 == aggregated.shape[0]:
+            break
+        communities = level[communities]
+        membership = sp.csr_matrix((np.ones(len(level)), (np.arange(len(level)), level)))
+        aggregated = (membership.T @ aggregated @ membership).tocsr()
+    sizes = np.bincount(communities)
+    rank = np.empty(len(sizes), dtype=int)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return rank[communities]
+
+
+class CommunityDetector:
+    """
+    Louvain communities of the knowledge graph (full graph or one dataset view, optionally only over some
+    relationship types) or of an entity projection:
+    - `entity_topic`: bipartite entity–topic graph, weighted by the number of plans/discussions on the topic
+      the entity participated in
+    - `co_participation`: entity x entity graph weighted by the number of shared topics
+
+    Results are cached per (dataset, relationship types, projection, resolution).
+    """
+
+    def __init__(self, graph: GraphArrays, projection: CoParticipationProjection):
+        self.graph = graph
+        self.projection = projection
+        self._cache = ResultCache("communities", max_bytes=COMMUNITY_CACHE_MAX_BYTES)
+        self._flights = SingleFlight("communities")
+
+    def _entity_topic(self, dataset: DatasetView) -> tuple[list, list, sp.csr_matrix]:
+        rows = [r for r in self.projection.rows if dataset == "full" or in_dataset(r["in_graph_mask"], dataset)]
+        topics = sorted({r["topic_id"] for r in rows}, key=str)
+        ids = [*self.projection.entity_ids, *topics]
+        labels = [self.projection.entity_types[e] for e in self.projection.entity_ids] + ["TOPIC"] * len(topics)
+        position = {node_id: i for i, node_id in enumerate(ids)}
+        # the projection rows are per (participation, meeting), count every participation once
+        pairs = {(r["entity_id"], r["topic_id"], r["meeting_id"]) for r in rows}
+        entity_idx = [position[e] for e, _, _ in pairs]
+        topic_idx = [position[t] for _, t, _ in pairs]
+        incidence = sp.csr_matrix((np.ones(len(pairs)), (entity_idx, topic_idx)), shape=(len(ids), len(ids)))
+        return ids, labels, (incidence + incidence.T).tocsr()
+
+    def _matrix(self, dataset: DatasetView, rel_types: tuple[str, ...], projection: CommunityProjection | None):
+        if projection == "entity_topic":
+            return self._entity_topic(dataset)
+        if projection == "co_participation":
+            matrix = self.projection.matrix("topics", None if dataset == "full" else dataset)
+            ids = self.projection.entity_ids
+            return ids, [self.projection.entity_types[e] for e in ids], matrix
+        nodes, matrix = self.graph.adjacency(dataset, list(rel_types) or None)
+        return list(self.graph.ids[nodes]), list(self.graph.labels[nodes]), matrix
+
+    def _compute(self, dataset: DatasetView, rel_types: tuple[str, ...], projection: CommunityProjection | None,
+                 resolution: float) -> dict:
+        ids, labels, matrix = self._matrix(dataset, rel_types, projection)
+        # nodes without any link would each form a community of their own
+        connected = np.flatnonzero(np.diff(matrix.indptr))
+        matrix = matrix[connected][:, connected]
+        communities = louvain(matrix, resolution)
+        sizes = np.bincount(communities) if len(communities) else np.zeros(0, dtype=int)
+        return {
+            "resolution": resolution,
+            "modularity": modularity(matrix, communities, resolution),
+            "num_communities": len(sizes),
+            "community_sizes": sizes.tolist(),
+            "nodes": [
+                {"id": ids[i], "type": labels[i], "community": int(c)}
+                for i, c in zip(connected, communities)
+            ],
+        }
+
+    async def communities(self, dataset: DatasetView = "full", rel_types: list[str] | None = None,
+                          projection: CommunityProjection | None = None, resolution: float = 1.0) -> dict:
+        """
+        Partition for the parameters, computed in a worker thread (once for concurrent identical requests) and cached,
+        least recently used partitions evicted beyond a memory budget. `resolution` is rounded to
+        `RESOLUTION_DECIMALS` decimals.
+        """
+        rel_types = tuple(sorted(set(rel_types or [])))
+        resolution = round(resolution, RESOLUTION_DECIMALS)
+        key = (dataset, rel_types, projection, resolution)
+        hit, result = self._cache.get(key)
+        if not hit:
+            result = await self._flights.do(key, lambda: self._compute_and_cache(key))
+        return result
+
+    async def _compute_and_cache(self, key: tuple) -> dict:
+        result = await asyncio.to_thread(self._compute, *key)
+        self._cache.put(key, result)
+        return result
+
+
+async def build_community_detector(driver: AsyncDriver) -> CommunityDetector:
+    return CommunityDetector(await graph_arrays.get(driver), await co_participation.get(driver))
+
+
+community_detector = LazyIndex("communities", build_community_detector)
@@ -1,38 +1,100 @@
 import asyncio
+import time
 from collections import defaultdict
+from datetime import date
 from typing import AsyncGenerator
 
-from neo4j import AsyncDriver, AsyncResult
+from neo4j import AsyncDriver, AsyncResult, Query
+from neo4j.exceptions import Neo4jError
 from neo4j.graph import Graph, Node, Relationship
 
-from .utils import convert_attr_values, serialize_neo4j_entity
+from .coalescing import canonical_params, query_flights
+from .profiling import current_profile
+from .result_cache import data_version, result_cache
+from .timeouts import QueryTimeout, is_timeout_error, query_timeout
+from .utils import ALL_DATASETS_MASK, convert_attr_values, in_meeting_window, meeting_number, membership_mask, serialize_neo4j_entity
 
 
-async def query_and_results(driver: AsyncDriver, query: str, params: dict = None) -> list[dict]:
+async def _execute_with_timeout(driver: AsyncDriver, query: str, params: dict = None, **kwargs):
+    """
+    Runs `driver.execute_query` with the transaction timeout of the endpoint currently being served.
+    The time spent is accounted to the request's profile if it is being profiled.
+    """
+    timeout = query_timeout.get()
+    start = time.perf_counter()
+    try:
+        return await driver.execute_query(Query(query, timeout=timeout), parameters_=params, **kwargs)
+    except Neo4jError as e:
+        if is_timeout_error(e):
+            print(f"Query exceeded timeout of {timeout}s and was terminated: {query}\n\twith parameters {params}")
+            raise QueryTimeout(query, params, timeout) from e
+        raise
+    finally:
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add_db_wait(time.perf_counter() - start)
+
+
+async def _cached(driver: AsyncDriver, key: tuple, execute, cache: bool, ttl: float | None):
+    """
+    Serves a query result from the result cache (see `result_cache`) or runs `execute`, coalesced with
+    identical concurrent executions, and caches its result for the current data version.
+    """
+    if not cache:
+        return await query_flights.do(key, execute)
+    key = (await data_version.current(driver), *key)
+    found, result = result_cache.get(key)
+    if found:
+        return result
+    result = await query_flights.do(key, execute)
+    result_cache.put(key, result, ttl)
+    return result
+
+
+async def query_and_results(driver: AsyncDriver, query: str, params: dict = None, cache: bool = True,
+                            ttl: float | None = None) -> list[dict]:
     """
     Execute a Cypher query asynchronously and return all results as a list of dictionaries.
     Use this for most use cases.
+    The query is run with the transaction timeout of the current endpoint (see `timeouts`).
+    Identical concurrent queries (same query and parameters) are coalesced into a single execution
+    and results are cached until the data changes, so the returned records are shared and must not be mutated.
 
     Args:
         driver (AsyncDriver): The Neo4j async driver instance.
         query (str): The Cypher query to execute.
+        params (dict): The query parameters.
+        cache (bool): Whether the result may be served from / stored in the result cache.
+        ttl (float | None): Seconds the result stays cached, defaults to `RESULT_CACHE_TTL`.
 
     Returns:
         list[dict]: List of records returned by the query, each as a dictionary.
     """
-    records, summary, keys = await driver.execute_query(query, parameters_=params)
-    print(
-        summary.query, "\n\t-> Results available after / consumed after (ms)",
-        summary.result_available_after, "/", summary.result_consumed_after
-    )
-    return records
-
-
-async def query_graph(driver: AsyncDriver, query: str, params: dict = None, result_transformer=AsyncResult.graph) -> Graph:
-    """Executes a Cypher query asynchronously and returns the result as a graph. E.g. for deduplication."""
-    graph = await driver.execute_query(query, parameters_=params, result_transformer_=result_transformer)
-    print(f"Executed graph query {query}")
-    return graph
+    async def _execute():
+        records, summary, keys = await _execute_with_timeout(driver, query, params)
+        print(
+            summary.query, "\n\t-> Results available after / consumed after (ms)",
+            summary.result_available_after, "/", summary.result_consumed_after
+        )
+        return records
+
+    return await _cached(driver, ("records", query, canonical_params(params)), _execute, cache, ttl)
+
+
+async def query_graph(driver: AsyncDriver, query: str, params: dict = None, result_transformer=AsyncResult.graph,
+                      cache: bool = True, ttl: float | None = None) -> Graph:
+    """
+    Executes a Cypher query asynchronously and returns the result as a graph. E.g. for deduplication.
+    Identical concurrent queries with the same transformer are coalesced into a single execution and
+    results are cached like in `query_and_results`.
+    """
+    async def _execute():
+        graph = await _execute_with_timeout(driver, query, params, result_transformer_=result_transformer)
+        print(f"Executed graph query {query}")
+        return graph
+
+    key = ("graph", query, canonical_params(params), result_transformer.__qualname__)
+    return await _cached(driver, key, _execute, cache, ttl)
 
 
 async def query_and_lazy_results(driver: AsyncDriver, query: str, params: dict = None) -> AsyncGenerator[dict, None]:
@@ -48,7 +110,7 @@ async def query_and_lazy_results(driver: AsyncDriver, query: str, params: dict =
         dict: Each record returned by the query as a dictionary.
     """
     async with driver.session() as sheesh:
-        results = await sheesh.run(query, parameters=params)
+        results = await sheesh.run(Query(query, timeout=query_timeout.get()), parameters=params)
         async for record in results.data():
             yield record
 
@@ -81,10 +143,16 @@ def _convert_visited_places(visit_rels: list[Relationship], place_nodes: list[No
     return places_out
 
 
-async def retrieve_trips_by_person(driver: AsyncDriver, person_id: str):
+# inclusive date window on the date of `var`, both bounds optional
+def _date_window(var: str) -> str:
+    return f'($date_from is null or {var}.date >= $date_from) and ($date_to is null or {var}.date <= $date_to)'
+
+
+async def retrieve_trips_by_person(driver: AsyncDriver, person_id: str, date_from: date | None = None, date_to: date | None = None):
     query = 'match (p:ENTITY_PERSON {id: $person_id})-[took]-(t:TRIP)-[visit]-(pl:PLACE) ' \
+        f'where {_date_window("t")} ' \
         'return took, t, collect(visit) as visit, collect(pl) as pl'
-    records = await query_and_results(driver, query, {'person_id': person_id})
+    records = await query_and_results(driver, query, {'person_id': person_id, 'date_from': date_from, 'date_to': date_to})
     return [
         {
             "trip": convert_attr_values(record['t']),
@@ -95,10 +163,11 @@ async def retrieve_trips_by_person(driver: AsyncDriver, person_id: str):
     ]
 
 
-async def num_trips_by_person(driver: AsyncDriver, person_id: str):
+async def num_trips_by_person(driver: AsyncDriver, person_id: str, date_from: date | None = None, date_to: date | None = None):
     query = 'match (p:ENTITY_PERSON {id: $person_id})-[took]-(t:TRIP)-[visit]-(pl:PLACE) ' \
+        f'where {_date_window("t")} ' \
         'return distinct took, t'
-    records = await query_and_results(driver, query, {'person_id': person_id})
+    records = await query_and_results(driver, query, {'person_id': person_id, 'date_from': date_from, 'date_to': date_to})
     counts = {k: 0 for k in ['jo', 'fi', 'tr']}
     def adder(record: dict):
         for k in record['took']['in_graph']:
@@ -110,12 +179,12 @@ async def num_trips_by_person(driver: AsyncDriver, person_id: str):
 async def graph_skeleton(driver: AsyncDriver, result_transformer=serializable_graph_transformer):
     query = """
         MATCH (n)
-        WHERE n.in_graph = $graph_keys  
+        WHERE n.in_graph_mask = $graph_mask
         OPTIONAL MATCH (n)-[r]-(m)
-        WHERE r.in_graph = $graph_keys
-        AND m.in_graph = $graph_keys
+        WHERE r.in_graph_mask = $graph_mask
+        AND m.in_graph_mask = $graph_mask
         RETURN n, r, m"""
-    serializable_graph = await query_graph(driver, query, {'graph_keys': ['jo', 'fi', 'tr']}, result_transformer)
+    serializable_graph = await query_graph(driver, query, {'graph_mask': ALL_DATASETS_MASK}, result_transformer)
     return serializable_graph
 
 
@@ -126,23 +195,17 @@ async def full_graph_no_roadmap(driver: AsyncDriver):
 
 
 async def nodes_only_in(driver: AsyncDriver, dataset: str):
-    query = "match (n:!ROADMAP_PLACE {in_graph: $in_graph_arr}) return n"
-    in_graph_arr = []
-    if dataset != "jo":
-        in_graph_arr.append("jo")
-    in_graph_arr.append(dataset)
-    nodes = (await query_graph(driver, query, {'in_graph_arr': in_graph_arr}))._nodes
+    query = "match (n:!ROADMAP_PLACE {in_graph_mask: $in_graph_mask}) return n"
+    in_graph_mask = membership_mask(["jo", dataset])
+    nodes = (await query_graph(driver, query, {'in_graph_mask': in_graph_mask}))._nodes
     return nodes
 
 
 async def links_only_in(driver: AsyncDriver, dataset: str):
-    query = "match (n)-[r {in_graph: $in_graph_arr}]->(m) return n, r, m"
+    query = "match (n)-[r {in_graph_mask: $in_graph_mask}]->(m) return n, r, m"
     # we want to return nodes so that the Graph object can reference them
-    in_graph_arr = []
-    if dataset != "jo":
-        in_graph_arr.append("jo")
-    in_graph_arr.append(dataset)
-    links = (await query_graph(driver, query, {'in_graph_arr': in_graph_arr}))._relationships
+    in_graph_mask = membership_mask(["jo", dataset])
+    links = (await query_graph(driver, query, {'in_graph_mask': in_graph_mask}))._relationships
     return links
 
 
@@ -185,6 +248,7 @@ async def entity_topic_participation(driver: AsyncDriver):
       p.sentiment as sentiment,
       p.reason as reason,
       p.in_graph as sentiment_recorded_in,
+      p.in_graph_mask as sentiment_mask,
       p.industry as topic_industry
     """
     records = await query_and_results(driver, query)
@@ -205,27 +269,31 @@ async def entity_topic_participation(driver: AsyncDriver):
             "sentiment": row["sentiment"],
             "reason": row["reason"],
             "sentiment_recorded_in": row["sentiment_recorded_in"],
+            "sentiment_mask": row["sentiment_mask"],
             "topic_industry": row["topic_industry"] if row["topic_industry"] != [] else ['misc']
         })
 
     return list(entity_topic_sentiments.values())
 
 
-async def personal_activity(driver: AsyncDriver, person_id: str):
-    query = "match (n {id: $person_id})-[rel]-(p:PLAN)--(m:MEETING), (p)--(t:TOPIC) return p, m.id, t.id, rel.in_graph"
+async def personal_activity(driver: AsyncDriver, person_id: str, from_meeting: int | None = None, to_meeting: int | None = None):
+    def _in_window(record) -> bool:
+        return in_meeting_window(meeting_number(record['m.id']), from_meeting, to_meeting)
+
+    query = "match (n {id: $person_id})-[rel]-(p:PLAN)--(m:MEETING), (p)--(t:TOPIC) return p, m.id, t.id, rel.in_graph, rel.in_graph_mask"
     records = await query_and_results(driver, query, {'person_id': person_id})
-    plans = [{"node" : serialize_neo4j_entity(r['p']), "meeting" : r['m.id'], "topic" : r['t.id'], "rel_exists_in": r['rel.in_graph']} for r in records]
+    plans = [{"node" : serialize_neo4j_entity(r['p']), "meeting" : r['m.id'], "topic" : r['t.id'], "rel_exists_in": r['rel.in_graph'], "rel_mask": r['rel.in_graph_mask']} for r in records if _in_window(r)]
 
-    query = "match (n {id: $person_id})-[rel]-(d:DISCUSSION)--(m:MEETING), (d)--(t:TOPIC) return d, m.id, t.id, rel.in_graph"
+    query = "match (n {id: $person_id})-[rel]-(d:DISCUSSION)--(m:MEETING), (d)--(t:TOPIC) return d, m.id, t.id, rel.in_graph, rel.in_graph_mask"
     records = await query_and_results(driver, query, {'person_id': person_id})
-    discussions = [{"node" : serialize_neo4j_entity(r['d']), "meeting" : r['m.id'], "topic" : r['t.id'], "rel_exists_in": r['rel.in_graph']} for r in records]
+    discussions = [{"node" : serialize_neo4j_entity(r['d']), "meeting" : r['m.id'], "topic" : r['t.id'], "rel_exists_in": r['rel.in_graph'], "rel_mask": r['rel.in_graph_mask']} for r in records if _in_window(r)]
     return plans, discussions
 
 
-async def ego_network(driver: AsyncDriver, node_id: str, node_type: str):
+async def ego_network(driver: AsyncDriver, node_id: str, node_type: str, result_transformer=serializable_graph_transformer):
     node_type_var = "e" if node_type in ["ENTITY_PERSON", "ENTITY_ORGANIZATION"] else "t"
     query = f"""match (t:TOPIC)-[a]-(pd:PLAN|DISCUSSION)-[b]-(e:ENTITY_PERSON|ENTITY_ORGANIZATION)
         where {node_type_var}.id = '{node_id}'
         optional match (pd)-[c]-(p:PLACE)
         return *"""
-    return await query_graph(driver, query, result_transformer=serializable_graph_transformer)
\ No newline at end of file
+    return await query_graph(driver, query, result_transformer=result_transformer)
\ No newline at end of file
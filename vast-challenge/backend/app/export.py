@@ -0,0 +1,155 @@
+import io
+import json
+from typing import AsyncGenerator, Literal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from neo4j import AsyncDriver, Query
+
+from .timeouts import query_timeout
+from .utils import convert
+
+ExportTable = Literal["participation", "nodes", "edges"]
+ExportFormat = Literal["arrow", "parquet"]
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+SCHEMAS = {
+    "participation": pa.schema([
+        ("entity_id", pa.string()),
+        ("entity_type", pa.string()),
+        ("topic_id", pa.string()),
+        ("activity_id", pa.string()),
+        ("activity_type", pa.string()),
+        ("sentiment", pa.float64()),
+        ("reason", pa.string()),
+        ("in_graph", pa.list_(pa.string())),
+        ("in_graph_mask", pa.int8()),
+        ("industry", pa.list_(pa.string())),
+    ]),
+    "nodes": pa.schema([
+        ("id", pa.string()),
+        ("label", pa.string()),
+        ("in_graph", pa.list_(pa.string())),
+        ("in_graph_mask", pa.int8()),
+        ("properties", pa.string()),
+    ]),
+    "edges": pa.schema([
+        ("source", pa.string()),
+        ("target", pa.string()),
+        ("type", pa.string()),
+        ("in_graph", pa.list_(pa.string())),
+        ("in_graph_mask", pa.int8()),
+        ("properties", pa.string()),
+    ]),
+}
+
+QUERIES = {
+    "participation": """
+        MATCH (t:TOPIC)--(pd:PLAN | DISCUSSION)-[p:PARTICIPANT]-(e:ENTITY_PERSON | ENTITY_ORGANIZATION)
+        RETURN toString(e.id) as entity_id, labels(e)[0] as entity_type, toString(t.id) as topic_id,
+            toString(pd.id) as activity_id, labels(pd)[0] as activity_type,
+            toFloat(p.sentiment) as sentiment, p.reason as reason,
+            p.in_graph as in_graph, p.in_graph_mask as in_graph_mask,
+            CASE WHEN p.industry IS NULL OR p.industry = [] THEN ['misc'] ELSE p.industry END as industry
+    """,
+    "nodes": """
+        MATCH (n:!ROADMAP_PLACE)
+        RETURN toString(n.id) as id, labels(n)[0] as label, n.in_graph as in_graph,
+            n.in_graph_mask as in_graph_mask, properties(n) as properties
+    """,
+    "edges": """
+        MATCH (n:!ROADMAP_PLACE)-[r:!IS]->(m)
+        RETURN toString(n.id) as source, toString(m.id) as target, type(r) as type, r.in_graph as in_graph,
+            r.in_graph_mask as in_graph_mask, properties(r) as properties
+    """,
+}
+
+# properties already exported as dedicated columns
+_COLUMN_PROPERTIES = {"id", "in_graph", "in_graph_mask"}
+
+
+def export_schema(table: ExportTable, columns: list[str] | None = None) -> pa.Schema:
+    """Schema of an export table, optionally reduced to the selected columns (in the given order)."""
+    schema = SCHEMAS[table]
+    if not columns:
+        return schema
+    unknown = [c for c in columns if c not in schema.names]
+    if unknown:
+        raise ValueError(f"Unknown columns for table '{table}': {unknown}. Available: {schema.names}")
+    return pa.schema([schema.field(c) for c in columns])
+
+
+def _row(record: dict, schema: pa.Schema) -> dict:
+    row = {name: record[name] for name in schema.names if name != "properties"}
+    if "properties" in schema.names:
+        properties = {k: convert(v) for k, v in record["properties"].items() if k not in _COLUMN_PROPERTIES}
+        row["properties"] = json.dumps(properties, default=str)
+    return row
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting written bytes until they are taken out."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_export(
+    driver: AsyncDriver,
+    table: ExportTable,
+    fmt: ExportFormat = "arrow",
+    columns: list[str] | None = None,
+    batch_size: int = 5000,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Streams an export table as Arrow IPC stream or Parquet file.
+
+    Records are consumed from the database result stream and written as one record batch
+    (Parquet: one row group) per `batch_size` records, so neither the full result nor the
+    full file has to be held in memory.
+    """
+    schema = export_schema(table, columns)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    def _write(rows: list[dict]):
+        writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+
+    async with driver.session() as session:
+        result = await session.run(Query(QUERIES[table], timeout=query_timeout.get()))
+        batch = []
+        async for record in result:
+            batch.append(_row(record, schema))
+            if len(batch) >= batch_size:
+                _write(batch)
+                batch = []
+                yield sink.take()
+        if batch:
+            _write(batch)
+    writer.close()
+    yield sink.take()
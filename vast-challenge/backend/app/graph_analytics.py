@@ -0,0 +1,269 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Literal
+
+import numpy as np
+import scipy.sparse as sp
+
+from .crud import query_and_results
+from .utils import ALL_DATASETS_MASK, DATASET_BITS, LazyIndex
+
+DatasetView = Literal["full", "jo", "fi", "tr"]
+# the skeleton consists of the nodes and links recorded in all datasets (see `/graph-skeleton`)
+GraphView = Literal["skeleton", "full", "jo", "fi", "tr"]
+CentralityMetric = Literal["degree", "weighted_degree", "pagerank", "betweenness"]
+DATASET_VIEWS: tuple[str, ...] = DatasetView.__args__
+CENTRALITY_METRICS: tuple[str, ...] = CentralityMetric.__args__
+
+# datasets a node or link must be recorded in (any of) to be part of a view
+VIEW_MASKS = {"skeleton": ALL_DATASETS_MASK, "full": ALL_DATASETS_MASK, **DATASET_BITS}
+
+# number of BFS sources processed together (as columns of one dense matrix) in a betweenness task
+BETWEENNESS_BATCH_SIZE = 128
+
+
+def in_view(masks: np.ndarray, view: GraphView) -> np.ndarray:
+    """Which of the membership masks (of nodes, links, participations, ...) belong to a view."""
+    if view == "skeleton":
+        return masks == ALL_DATASETS_MASK
+    return (masks & VIEW_MASKS[view]) != 0
+
+
+def centrality_property(metric: str, view: str) -> str:
+    """Name of the node property holding a centrality, e.g. `pagerank_fi`."""
+    return f"{metric}_{view}"
+
+
+def adjacency(node_ids: list, edges: Iterable[tuple], view_mask: int) -> tuple[np.ndarray, sp.csr_matrix]:
+    """
+    Undirected weighted adjacency matrix of the subgraph of a dataset view, given the nodes as
+    (id, membership mask) and the edges as (source, target, membership mask).
+
+    Only nodes and edges recorded in one of the datasets of `view_mask` are part of the view. An edge's
+    weight is the number of datasets of the view it is recorded in, summed over parallel edges,
+    so in the full view links corroborated by several datasets weigh more.
+    Returns the ids of the view's nodes (row order) and the matrix.
+    """
+    ids = [node_id for node_id, mask in node_ids if mask & view_mask]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    rows, cols, weights = [], [], []
+    for source, target, mask in edges:
+        weight = (mask & view_mask).bit_count()
+        if weight and source in index and target in index and source != target:
+            rows += [index[source], index[target]]
+            cols += [index[target], index[source]]
+            weights += [weight, weight]
+    matrix = sp.csr_matrix((weights, (rows, cols)), shape=(len(ids), len(ids)), dtype=float)
+    matrix.sum_duplicates()
+    return np.array(ids, dtype=object), matrix
+
+
+def pagerank(matrix: sp.csr_matrix, damping: float = 0.85, tol: float = 1e-10, max_iter: int = 200) -> np.ndarray:
+    """Weighted PageRank by power iteration; the rank of dangling nodes is spread uniformly."""
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    transition = sp.diags(np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)) @ matrix
+    transition_t = transition.T.tocsr()
+    rank = np.full(n, 1 / n)
+    for _ in range(max_iter):
+        previous = rank
+        rank = damping * (transition_t @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(rank - previous).sum() < n * tol:
+            break
+    return rank
+
+
+def _betweenness_batch(indptr: np.ndarray, indices: np.ndarray, sources: np.ndarray) -> np.ndarray:
+    """
+    Dependencies accumulated by Brandes' algorithm (unweighted shortest paths) for a batch of sources.
+    The BFS of all sources of the batch runs level-synchronously as sparse-dense matrix products,
+    one column per source.
+    """
+    n = len(indptr) - 1
+    matrix = sp.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n, n))
+    columns = np.arange(len(sources))
+    sigma = np.zeros((n, len(sources)))
+    sigma[sources, columns] = 1
+    reached = sigma > 0
+    levels = [reached.copy()]
+    frontier = sigma.copy()
+    while True:
+        frontier = np.where(reached, 0, matrix @ frontier)
+        level = frontier > 0
+        if not level.any():
+            break
+        sigma += frontier
+        reached |= level
+        levels.append(level)
+
+    delta = np.zeros_like(sigma)
+    safe_sigma = np.where(sigma > 0, sigma, 1)
+    for d in range(len(levels) - 1, 0, -1):
+        contribution = np.where(levels[d], (1 + delta) / safe_sigma, 0)
+        delta += np.where(levels[d - 1], sigma * (matrix @ contribution), 0)
+    delta[sources, columns] = 0
+    return delta.sum(axis=1)
+
+
+def betweenness(matrix: sp.csr_matrix, processes: int | None = None,
+                batch_size: int = BETWEENNESS_BATCH_SIZE) -> np.ndarray:
+    """
+    Normalized betweenness centrality (Brandes, ignoring edge weights) of an undirected graph.
+    Sources are split into batches that are processed in parallel by a pool of `processes` processes
+    (default: one per CPU; 1 runs in the calling process).
+    """
+    n = matrix.shape[0]
+    if n < 3:
+        return np.zeros(n)
+    binary = matrix.copy()
+    binary.data[:] = 1
+    batches = np.array_split(np.arange(n), max(1, -(-n // batch_size)))
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(batches) == 1:
+        partials = [_betweenness_batch(binary.indptr, binary.indices, batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(batches))) as pool:
+            partials = list(pool.map(
+                _betweenness_batch,
+                *zip(*[(binary.indptr, binary.indices, batch) for batch in batches])
+            ))
+    # every unordered pair is counted from both of its ends
+    return np.sum(partials, axis=0) / ((n - 1) * (n - 2))
+
+
+def compute_centralities(nodes: list[tuple], edges: list[tuple], processes: int | None = None) -> dict[str, dict[str, dict]]:
+    """
+    Degree, weighted degree, PageRank and betweenness of every node in the full graph and in each dataset view.
+    `nodes` are (id, membership mask), `edges` (source, target, membership mask) tuples.
+    Returns view -> node id -> metric -> value; nodes not in a view are missing from it.
+    """
+    centralities = {}
+    for view in DATASET_VIEWS:
+        ids, matrix = adjacency(nodes, edges, VIEW_MASKS[view])
+        values = {
+            "degree": np.diff(matrix.indptr),
+            "weighted_degree": np.asarray(matrix.sum(axis=1)).ravel(),
+            "pagerank": pagerank(matrix),
+            "betweenness": betweenness(matrix, processes),
+        }
+        centralities[view] = {
+            node_id: {metric: values[metric][i].item() for metric in CENTRALITY_METRICS}
+            for i, node_id in enumerate(ids)
+        }
+        print(f"Computed centralities of {len(ids)} nodes in view {view}")
+    return centralities
+
+
+def centrality_properties(centralities: dict[str, dict[str, dict]]) -> dict[object, dict[str, float]]:
+    """Flattens the result of `compute_centralities` into node id -> property name -> value."""
+    properties = {}
+    for view, by_node in centralities.items():
+        for node_id, metrics in by_node.items():
+            properties.setdefault(node_id, {}).update(
+                {centrality_property(metric, view): value for metric, value in metrics.items()}
+            )
+    return properties
+
+
+async def ensure_centralities(driver):
+    """
+    Computes and stores the centralities as node properties if the database was loaded without them
+    (`load_data.py` computes them at load time, in parallel, so this only runs once per loaded data version).
+    """
+    records, _, _ = await driver.execute_query(
+        f"MATCH (n) WHERE n.{centrality_property('pagerank', 'full')} IS NOT NULL RETURN count(n) > 0 as present")
+    if records[0]["present"]:
+        return
+    print("Centralities missing, computing them...")
+    node_records, _, _ = await driver.execute_query(
+        "MATCH (n:!ROADMAP_PLACE) WHERE n.in_graph_mask IS NOT NULL RETURN n.id as id, n.in_graph_mask as mask")
+    edge_records, _, _ = await driver.execute_query(
+        "MATCH (n:!ROADMAP_PLACE)-[r:!IS]->(m:!ROADMAP_PLACE) RETURN n.id as source, m.id as target, r.in_graph_mask as mask")
+    nodes = [(r["id"], r["mask"]) for r in node_records]
+    edges = [(r["source"], r["target"], r["mask"] or 0) for r in edge_records]
+    # in the calling process: forking a pool from a thread of the (multi-threaded) server process may deadlock,
+    # and at the size of this graph the computation takes well under a second anyway
+    centralities = await asyncio.to_thread(compute_centralities, nodes, edges, processes=1)
+    rows = [{"id": node_id, "properties": props} for node_id, props in centrality_properties(centralities).items()]
+    await driver.execute_query(
+        "UNWIND $rows as row MATCH (n:!ROADMAP_PLACE {id: row.id}) SET n += row.properties", {"rows": rows})
+
+
+class GraphArrays:
+    """
+    The knowledge graph (without the road map) as flat arrays: nodes with id, label, membership mask and zone (places),
+    links as source/target node positions with relationship type and membership mask.
+    Adjacency matrices of dataset views and relationship subsets are derived from it without querying.
+    """
+
+    def __init__(self, nodes: list[dict], links: list[dict]):
+        self.ids = np.array([n["id"] for n in nodes], dtype=object)
+        self.labels = np.array([n["label"] for n in nodes], dtype=object)
+        self.node_masks = np.array([n["in_graph_mask"] or 0 for n in nodes], dtype=np.int8)
+        self.zones = np.array([n.get("zone") for n in nodes], dtype=object)
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        links = [l for l in links if l["source"] in self.index and l["target"] in self.index]
+        self.sources = np.array([self.index[l["source"]] for l in links], dtype=int)
+        self.targets = np.array([self.index[l["target"]] for l in links], dtype=int)
+        self.rel_types = np.array([l["type"] for l in links], dtype=object)
+        self.link_masks = np.array([l["in_graph_mask"] or 0 for l in links], dtype=np.int8)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _in_view(self, masks: np.ndarray, view: GraphView) -> np.ndarray:
+        return in_view(masks, view)
+
+    def view_nodes(self, view: GraphView = "full") -> np.ndarray:
+        """Positions of the nodes in a view."""
+        return np.flatnonzero(self._in_view(self.node_masks, view))
+
+    def view_links(self, view: GraphView = "full", rel_types: list[str] | None = None) -> np.ndarray:
+        """Positions of the (non self-loop) links in a view, optionally only of some relationship types."""
+        in_view = self._in_view(self.node_masks, view)
+        keep = self._in_view(self.link_masks, view) & in_view[self.sources] & in_view[self.targets] \
+            & (self.sources != self.targets)
+        if rel_types:
+            keep &= np.isin(self.rel_types, rel_types)
+        return np.flatnonzero(keep)
+
+    def adjacency(self, view: GraphView = "full", rel_types: list[str] | None = None) -> tuple[np.ndarray, sp.csr_matrix]:
+        """
+        Undirected adjacency matrix of a view (weights like in `adjacency`), optionally built
+        from some relationship types only. Returns the positions of the view's nodes (row order) and the matrix.
+        """
+        nodes = self.view_nodes(view)
+        links = self.view_links(view, rel_types)
+        position = np.full(len(self.ids), -1)
+        position[nodes] = np.arange(len(nodes))
+        rows, cols = position[self.sources[links]], position[self.targets[links]]
+        weights = np.bitwise_and(self.link_masks[links], VIEW_MASKS[view]).astype(np.uint8)
+        weights = np.unpackbits(weights[:, None], axis=1).sum(axis=1).astype(float)
+        matrix = sp.csr_matrix(
+            (np.concatenate([weights, weights]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+            shape=(len(nodes), len(nodes))
+        )
+        matrix.sum_duplicates()
+        return nodes, matrix
+
+
+async def build_graph_arrays(driver) -> GraphArrays:
+    node_query = """
+        MATCH (n:!ROADMAP_PLACE)
+        RETURN n.id as id, labels(n)[0] as label, n.in_graph_mask as in_graph_mask, n.zone as zone"""
+    link_query = """
+        MATCH (n:!ROADMAP_PLACE)-[r:!IS]->(m:!ROADMAP_PLACE)
+        RETURN n.id as source, m.id as target, type(r) as type, r.in_graph_mask as in_graph_mask"""
+    async with asyncio.TaskGroup() as tg:
+        t1 = tg.create_task(query_and_results(driver, node_query, cache=False))
+        t2 = tg.create_task(query_and_results(driver, link_query, cache=False))
+    graph = GraphArrays(t1.result(), t2.result())
+    print(f"Built graph arrays with {len(graph)} nodes and {len(graph.sources)} links")
+    return graph
+
+
+graph_arrays = LazyIndex("graph-arrays", build_graph_arrays)
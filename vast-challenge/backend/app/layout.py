@@ -0,0 +1,198 @@
+import asyncio
+import zlib
+
+import numpy as np
+import scipy.sparse as sp
+from neo4j import AsyncDriver
+
+from .graph_analytics import GraphArrays, GraphView, graph_arrays
+from .utils import LazyIndex
+
+# ideal link length in layout units (same as the default link distance of d3-force)
+LINK_LENGTH = 30.0
+LAYOUT_ITERATIONS = 300
+# Barnes–Hut opening criterion: a quadtree cell is approximated by its center of mass
+# if its size is below THETA times its distance
+THETA = 0.8
+MAX_DEPTH = 12
+# pull of every node towards the center, proportional to its distance
+GRAVITY = 0.5
+
+
+def initial_positions(ids, radius: float) -> np.ndarray:
+    """
+    Seed positions derived from a hash of each node id, so a node starts at the same place in every
+    view and after every reload, independent of the other nodes.
+    """
+    hashes = np.array([zlib.crc32(str(node_id).encode()) for node_id in ids], dtype=np.uint64)
+    angle = (hashes & 0xFFFF) / 0x10000 * 2 * np.pi
+    distance = np.sqrt((hashes >> np.uint64(16)) / 0x10000) * radius
+    return np.stack([np.cos(angle) * distance, np.sin(angle) * distance], axis=1).astype(float)
+
+
+def _quadtree(positions: np.ndarray, depth: int) -> list[dict]:
+    """
+    Quadtree over the positions as one level per depth (the root being level 0): for each level the cell of
+    every point, the mass (number of points) and center of mass of every occupied cell and the children
+    of every cell in the next level (CSR style `child_ptr`/`children`).
+    """
+    low = positions.min(axis=0)
+    size = max(np.ptp(positions, axis=0).max(), 1e-9) * (1 + 1e-9)
+    unit = (positions - low) / size
+    levels = []
+    for level in range(depth + 1):
+        cells_per_side = 2 ** level
+        coords = np.minimum((unit * cells_per_side).astype(np.int64), cells_per_side - 1)
+        keys = coords[:, 0] * cells_per_side + coords[:, 1]
+        _, first, cell_of = np.unique(keys, return_index=True, return_inverse=True)
+        cell_of = cell_of.ravel()
+        mass = np.bincount(cell_of).astype(float)
+        center = np.stack([np.bincount(cell_of, weights=positions[:, i]) for i in (0, 1)], axis=1) / mass[:, None]
+        levels.append({"cell_of": cell_of, "first": first, "mass": mass, "center": center,
+                       "size": size / cells_per_side})
+    for parent, child in zip(levels, levels[1:]):
+        parent_of_child = parent["cell_of"][child["first"]]
+        order = np.argsort(parent_of_child, kind="stable")
+        parent["children"] = order
+        parent["child_ptr"] = np.concatenate([[0], np.cumsum(np.bincount(parent_of_child, minlength=len(parent["mass"])))])
+    return levels
+
+
+def barnes_hut_repulsion(positions: np.ndarray, strength: float, theta: float = THETA,
+                         depth: int = MAX_DEPTH) -> np.ndarray:
+    """
+    Repulsive displacement `strength * mass / distance` (away from every other point) of every point,
+    approximated with a quadtree: the tree is traversed for all points at once, level by level, as arrays of
+    (point, cell) pairs. Pairs with a distant enough cell (or a single other point) are resolved with the
+    cell's center of mass, the others are expanded into the cell's children. Points sharing a leaf cell
+    interact exactly with the rest of that cell.
+    """
+    n = len(positions)
+    displacement = np.zeros_like(positions)
+    if n < 2:
+        return displacement
+    levels = _quadtree(positions, depth)
+    min_distance = 1e-3
+
+    def _push(points, centers, mass):
+        delta = positions[points] - centers
+        distance = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), min_distance)
+        force = strength * mass / distance ** 2
+        for i in (0, 1):
+            displacement[:, i] += np.bincount(points, weights=delta[:, i] * force, minlength=n)
+
+    root = levels[0]
+    points = np.repeat(np.arange(n), root["child_ptr"][1])
+    cells = np.tile(root["children"], n)
+    for level in range(1, depth + 1):
+        tree = levels[level]
+        own = tree["cell_of"][points] == cells
+        mass = tree["mass"][cells]
+        delta = positions[points] - tree["center"][cells]
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        resolved = ~own & ((tree["size"] < theta * distance) | (mass == 1))
+        if level == depth:
+            resolved = ~own
+            # coincident or very close points in the point's own leaf: exclude the point itself
+            shared = own & (mass > 1)
+            own_points, own_cells = points[shared], cells[shared]
+            others = mass[shared] - 1
+            centers = (tree["center"][own_cells] * mass[shared, None] - positions[own_points]) / others[:, None]
+            _push(own_points, centers, others)
+        _push(points[resolved], tree["center"][cells[resolved]], mass[resolved])
+
+        expand = ~resolved & ~(own & (mass == 1))
+        if level == depth or not expand.any():
+            break
+        points, cells = points[expand], cells[expand]
+        starts, counts = tree["child_ptr"][cells], np.diff(tree["child_ptr"])[cells]
+        points = np.repeat(points, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = tree["children"][np.repeat(starts, counts) + offsets]
+    return displacement
+
+
+def force_layout(matrix: sp.csr_matrix, initial: np.ndarray, iterations: int = LAYOUT_ITERATIONS,
+                 link_length: float = LINK_LENGTH, gravity: float = GRAVITY) -> np.ndarray:
+    """
+    Fruchterman–Reingold force-directed layout: linked nodes attract each other with distance² / k,
+    all nodes repel each other with k² / distance (Barnes–Hut approximated) and a weak gravity keeps
+    disconnected components together. The step size is limited by a linearly cooling temperature,
+    so the result only depends on the initial positions.
+    """
+    positions = initial.copy()
+    n = len(positions)
+    if n < 2:
+        return positions
+    links = sp.triu(matrix, k=1).tocoo()
+    sources, targets = links.row, links.col
+    k = link_length
+    temperature = k * np.sqrt(n) / 4
+    cooling = temperature / iterations
+    for _ in range(iterations):
+        displacement = barnes_hut_repulsion(positions, k ** 2)
+        delta = positions[sources] - positions[targets]
+        distance = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-3)
+        pull = delta * (distance / k)[:, None]
+        for i in (0, 1):
+            displacement[:, i] += np.bincount(targets, weights=pull[:, i], minlength=n)
+            displacement[:, i] -= np.bincount(sources, weights=pull[:, i], minlength=n)
+        displacement -= gravity * positions
+        length = np.maximum(np.hypot(displacement[:, 0], displacement[:, 1]), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature = max(temperature - cooling, k / 100)
+    return positions - positions.mean(axis=0)
+
+
+class GraphLayouts:
+    """
+    Force-directed layouts of the graph views, computed on first request (in a worker thread, once
+    per view even for concurrent requests) and cached per view.
+    """
+
+    def __init__(self, graph: GraphArrays):
+        self.graph = graph
+        self._cache: dict[str, dict] = {}
+        self._lock = asyncio.Lock()
+
+    def _compute(self, view: GraphView) -> dict:
+        nodes, matrix = self.graph.adjacency(view)
+        ids = self.graph.ids[nodes]
+        initial = initial_positions(ids, LINK_LENGTH * np.sqrt(len(ids)))
+        layout = np.round(force_layout(matrix, initial), 2)
+        print(f"Computed layout of {len(ids)} nodes for view {view}")
+        return {node_id: (float(x), float(y)) for node_id, (x, y) in zip(ids, layout)}
+
+    async def positions(self, view: GraphView) -> dict:
+        """Node id -> (x, y) in the layout of a view."""
+        if view not in self._cache:
+            async with self._lock:
+                if view not in self._cache:
+                    self._cache[view] = await asyncio.to_thread(self._compute, view)
+        return self._cache[view]
+
+    async def with_positions(self, nodes: list[dict], view: GraphView) -> list[dict]:
+        """Copies of serialized nodes with their `x`/`y` in the layout of a view (if they are part of it)."""
+        positions = await self.positions(view)
+        return [
+            {**node, "x": positions[node["id"]][0], "y": positions[node["id"]][1]} if node.get("id") in positions else node
+            for node in nodes
+        ]
+
+    async def with_position_columns(self, graph: dict, view: GraphView) -> dict:
+        """Copy of a columnar graph (see `columnar`) with `x`/`y` node columns, null for nodes not in the view."""
+        positions = await self.positions(view)
+        coordinates = [positions.get(node_id) for node_id in graph["nodes"]["id"]]
+        nodes = {
+            **graph["nodes"],
+            "x": [c[0] if c else None for c in coordinates],
+            "y": [c[1] if c else None for c in coordinates],
+        }
+        return {**graph, "nodes": nodes}
+
+
+async def build_graph_layouts(driver: AsyncDriver) -> GraphLayouts:
+    return GraphLayouts(await graph_arrays.get(driver))
+
+
+graph_layouts = LazyIndex("layouts", build_graph_layouts)
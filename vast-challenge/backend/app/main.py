@@ -1,17 +1,42 @@
 import asyncio
+from datetime import date
 from itertools import product
 import time
 from typing import Literal
 import pandas as pd
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
 from neo4j import AsyncDriver, AsyncGraphDatabase, basic_auth
 import os
 import numpy as np
 
-from .models import IndustryProContraSentiment, Entity, BaseGraphObject, EntityTopicSentiment, GraphMembership, PersonalActivity
-from .crud import dataset_specific_nodes_and_links, ego_network, entity_topic_participation, graph_skeleton, num_trips_by_person, personal_activity, query_and_results, retrieve_entities, retrieve_trips_by_person
-from .utils import cosine_similarity_with_nans, serialize_neo4j_entity, is_database_empty, load_initial_data
+from .models import IndustryProContraSentiment, Entity, BaseGraphObject, BatchRequest, BatchResult, EntityTopicSentiment, GraphMembership, PersonalActivity, SearchHit, SentimentFilterResult
+from .crud import dataset_specific_nodes_and_links, ego_network, entity_topic_participation, graph_skeleton, num_trips_by_person, personal_activity, query_and_results, retrieve_entities, retrieve_trips_by_person, serializable_graph_transformer
+from .batch import in_batch, run_batch
+from .bias import BOOTSTRAP_RESAMPLES, PERMUTATIONS, BiasLevel, bias_statistics
+from .coalescing import coalesce_endpoint, coalescing_metrics
+from .coarsening import MAX_SUPERNODES, CoarseGrouping, graph_coarsening
+from .colocation import colocation_engine
+from .columnar import GraphFormat, columnar_graph, columnar_graph_transformer
+from .communities import MAX_RESOLUTION, CommunityProjection, community_detector
+from .export import MEDIA_TYPES, ExportFormat, ExportTable, export_schema, stream_export
+from .graph_analytics import CentralityMetric, DatasetView, GraphView, CENTRALITY_METRICS, centrality_property, ensure_centralities, graph_arrays
+from .layout import graph_layouts
+from .matrix import MatrixFormat, MatrixKind, MatrixOrder, MatrixValue, adjacency_matrices
+from .membership import ElementKind, membership_index
+from .profiling import ProfilingMiddleware, get_profile, profiles
+from .projection import ProjectionWeight, co_participation
+from .result_cache import cache_endpoint, data_version, result_cache_metrics
+from .roadmap import road_network
+from .search import search_index
+from .sentiment_table import CubeDimension, Polarity, StanceLevel, sentiment_table
+from .spatial import spatial_index
+from .timeline import sentiment_timeline
+from .timeouts import QueryTimeout, QueryTimeoutMiddleware
+from .utils import cosine_similarity_with_nans, dataset_category, ensure_membership_masks, in_dataset, serialize_neo4j_entity, is_database_empty, load_initial_data
+from .warmup import warmup
 
 # Neo4j connection details from environment variables or local development
 NEO4J_URI = f"bolt://{os.getenv('DB_HOST', 'localhost')}:7687"
@@ -51,6 +76,10 @@ async def lifespan(app: FastAPI):
                         print("Initial data loading failed, but continuing...")
                 else:
                     print("Database already contains data. Skipping initial data load.")
+                await ensure_membership_masks(driver)
+                await ensure_centralities(driver)
+                # the steps above may have written to the database
+                data_version.bump()
             except Exception as data_error:
                 print(f"Error during data loading check/process: {data_error}")
                 print("Continuing without initial data load...")
@@ -67,8 +96,12 @@ async def lifespan(app: FastAPI):
                 print("Database-dependent endpoints will return 503 Service Unavailable.")
                 driver = None
 
+    warmup_task = asyncio.create_task(warmup.run(warmup_steps(driver))) if driver else None
+
     yield
 
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
     if driver:
         try:
             print("Closing Neo4j connection.")
@@ -77,7 +110,43 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             print(f"Error closing Neo4j connection: {e}")
 
+
+def warmup_steps(driver: AsyncDriver) -> dict:
+    """
+    Heavy endpoints and in-memory indexes precomputed after startup, by endpoint path / index name. Endpoint
+    responses are kept by `cache_endpoint` (until evicted or the data changes), indexes by their `LazyIndex`.
+    """
+    steps = {
+        "/graph-skeleton": lambda: get_graph_skeleton(layout=True, driver=driver),
+        "/retrieve-sentiments": lambda: retrieve_sentiments(driver=driver),
+        "/sentiments-by-industry": lambda: retrieve_sentiments_aggregate_by_industry(from_meeting=None, to_meeting=None, driver=driver),
+        "/industry-pro-contra-sentiments": lambda: retrieve_industry_pro_contra_sentiments(from_meeting=None, to_meeting=None, driver=driver),
+        "/industry-interest-alignment": lambda: retrieve_industry_interest_alignment(weight=False, from_meeting=None, to_meeting=None, driver=driver),
+        "/industry-interest-alignment?weight=true": lambda: retrieve_industry_interest_alignment(weight=True, from_meeting=None, to_meeting=None, driver=driver),
+        "/bias-statistics": lambda: retrieve_bias_statistics(
+            level="entity_industry", entity=None, industry=None, min_sentiments=1, resamples=BOOTSTRAP_RESAMPLES,
+            permutations=PERMUTATIONS, confidence=0.95, seed=0, driver=driver),
+    }
+    for dataset in (GraphMembership.FILAH, GraphMembership.TROUT):
+        steps[f"/dataset-specific-nodes-edges?dataset={dataset}"] = \
+            lambda dataset=dataset: nodes_and_edges_only_in(dataset, neighbors=False, layout=True, driver=driver)
+    for index in (sentiment_table, search_index, spatial_index, road_network, colocation_engine, co_participation,
+                  graph_arrays, community_detector, sentiment_timeline, membership_index):
+        steps[f"index:{index.name}"] = lambda index=index: index.get(driver)
+    return steps
+
+
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(QueryTimeoutMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request, exc: QueryTimeout):
+    return JSONResponse(
+        status_code=504,
+        content={"detail": f"The database query took longer than the configured timeout of {exc.timeout}s."}
+    )
 
 
 @app.get("/")
@@ -92,7 +161,9 @@ async def get_driver() -> AsyncDriver:
             detail="Neo4j database is not available. Please check database connection and try again later."
         )
     
-    # Additional connectivity check
+    # Additional connectivity check, done once for all sub-requests of a batch
+    if in_batch.get():
+        return driver
     try:
         await driver.verify_connectivity()
         return driver
@@ -103,15 +174,33 @@ async def get_driver() -> AsyncDriver:
         )
 
 
+@app.post("/batch", response_model=list[BatchResult])
+async def batch(request: BatchRequest, _: AsyncDriver = Depends(get_driver)):
+    """
+    Executes several GET requests of this API in one round trip, e.g.
+    `{"requests": [{"path": "/trip-activity-by-person", "params": {"person_id": "Sean"}}, ...]}`.
+    Sub-requests run concurrently (bounded by `BATCH_CONCURRENCY`) and share the cached data and the
+    database connection, which is checked once for the whole batch. Every result carries the HTTP status
+    and body the sub-request would have had on its own, in request order.
+    """
+    return await run_batch(app, [item.model_dump() for item in request.requests])
+
+
 @app.get("/health")
-async def health_check():
+async def health_check(ready: bool = False):
     """
     Health check endpoint that works regardless of database status.
+
+    `warm` tells whether the warm-up of the heavy endpoints after startup has finished, `warmup` reports
+    the duration of each of its steps. With `ready=true` the endpoint answers 503 until then, so it can be
+    used as readiness probe by load balancers.
     """
     result = {
         "status": "ok",
         "backend": "running",
-        "neo4j_connection": "unknown"
+        "neo4j_connection": "unknown",
+        "warm": warmup.is_warm,
+        "warmup": warmup.status(),
     }
     
     if driver:
@@ -123,10 +212,46 @@ async def health_check():
             result["neo4j_error"] = str(e)
     else:
         result["neo4j_connection"] = "not_initialized"
-    
+
+    if ready and not warmup.is_warm:
+        return JSONResponse(status_code=503, content=jsonable_encoder(result))
     return result
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime metrics of the backend. `coalescing` reports, separately for database queries and
+    endpoint transforms, how many calls were served by an already running identical execution.
+    `result_cache` reports the hit ratio, size and evictions of the query result cache and the
+    current data version.
+    """
+    return {"coalescing": coalescing_metrics(), "result_cache": result_cache_metrics()}
+
+
+@app.get("/debug/profiles", tags=["Debug"])
+async def list_profiles():
+    """
+    Summaries of the most recent request profiles, newest first. Requests are profiled when sent with
+    the `X-Profile: 1` header or `profile=1` query parameter, and at random with `PROFILE_SAMPLE_RATE`.
+    """
+    return [profile.summary() for profile in reversed(profiles)]
+
+
+@app.get("/debug/profiles/{profile_id}", tags=["Debug"])
+async def retrieve_profile(profile_id: int, folded: bool = False):
+    """
+    A single request profile with its sampled stacks, split into `db_wait` and `python` root frames.
+    With `folded` the stacks are returned as plain text in the folded format (flamegraph.pl, speedscope).
+    """
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found (anymore)")
+    if folded:
+        return PlainTextResponse(profile.folded())
+    return profile.to_dict()
+
+
 @app.get("/database-status")
 async def database_status():
     """
@@ -160,41 +285,370 @@ async def entities(entity: Entity, driver: AsyncDriver = Depends(get_driver)):
     return await retrieve_entities(driver, entity)
 
 
+@app.get("/search", response_model=list[SearchHit])
+async def search(
+    q: str,
+    k: int = Query(10, ge=1, le=100),
+    label: list[Entity] | None = Query(None),
+    dataset: GraphMembership | None = None,
+    fuzzy: bool = False,
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Typeahead search over node ids, names, PLACE names, topic and plan/discussion titles
+    and the reasons given in PARTICIPANT relationships.
+
+    The last token of `q` is matched as a prefix, all other tokens have to match exactly
+    (or within a small edit distance if `fuzzy` is set). Results can be restricted to certain
+    node labels and to nodes contained in a dataset and are capped at `k`.
+    """
+    index = await search_index.get(driver)
+    return index.search(q, k=k, labels=label, dataset=dataset, fuzzy=fuzzy)
+
+
+PlaceKind = Literal["PLACE", "ROADMAP_PLACE"]
+
+
+@app.get("/places/bbox", tags=["Places"])
+async def places_in_bbox(
+    min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+    kind: list[PlaceKind] | None = Query(None),
+    limit: int | None = Query(None, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    PLACE and ROADMAP_PLACE points inside the viewport. All points carry normalized `lon`/`lat` fields.
+    """
+    index = await spatial_index.get(driver)
+    return index.bbox(min_lon, min_lat, max_lon, max_lat, kinds=kind, limit=limit)
+
+
+@app.get("/places/radius", tags=["Places"])
+async def places_in_radius(
+    lon: float, lat: float, radius_m: float = Query(..., gt=0),
+    kind: list[PlaceKind] | None = Query(None),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """Points within `radius_m` meters of (`lon`, `lat`), closest first, with their `distance_m`."""
+    index = await spatial_index.get(driver)
+    return index.radius(lon, lat, radius_m, kinds=kind)
+
+
+@app.get("/places/nearest", tags=["Places"])
+async def places_nearest(
+    lon: float, lat: float, k: int = Query(5, ge=1, le=500),
+    kind: list[PlaceKind] | None = Query(None),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """The `k` points closest to (`lon`, `lat`), closest first, with their `distance_m`."""
+    index = await spatial_index.get(driver)
+    return index.nearest(lon, lat, k, kinds=kind)
+
+
+@app.get("/places/clusters", tags=["Places"])
+async def place_clusters(
+    zoom: int = Query(..., ge=0, le=22),
+    min_lon: float | None = None, min_lat: float | None = None,
+    max_lon: float | None = None, max_lat: float | None = None,
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Points clustered for a map zoom level, optionally restricted to a viewport.
+    Clusters with more than one point have a `cluster_id`, their centroid, `count` and counts per `kinds`.
+    """
+    index = await spatial_index.get(driver)
+    return index.clusters(zoom, min_lon, min_lat, max_lon, max_lat)
+
+
+@app.get("/roadmap/geometry", tags=["Places"])
+async def roadmap_geometry(
+    zoom: int | None = Query(None, ge=0, le=22),
+    min_lon: float | None = None, min_lat: float | None = None,
+    max_lon: float | None = None, max_lat: float | None = None,
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    The road network (ROADMAP_PLACE nodes connected by ROUTE relationships) as GeoJSON LineStrings.
+
+    With `zoom` the lines are Douglas–Peucker simplified to about a pixel of tolerance at that zoom level
+    and lines smaller than a pixel are left out; without it (or beyond zoom 14) the full resolution is returned.
+    If a viewport is given, only lines whose bounding box intersects it are returned.
+    """
+    network = await road_network.get(driver)
+    return network.geometry(zoom, min_lon, min_lat, max_lon, max_lat)
+
+
 @app.get("/trip-activity-by-person")
-async def trips_of_person(person_id: str, driver: AsyncDriver = Depends(get_driver)):
-    records = await retrieve_trips_by_person(driver, person_id)
+async def trips_of_person(
+    person_id: str,
+    date_from: date | None = Query(None, alias="from"),
+    date_to: date | None = Query(None, alias="to"),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    records = await retrieve_trips_by_person(driver, person_id, date_from, date_to)
     return records
 
 
 @app.get("/num-trips-by-person")
-async def num_trips_of_person(person_id: str, driver: AsyncDriver = Depends(get_driver)):
-    return await num_trips_by_person(driver, person_id)
+async def num_trips_of_person(
+    person_id: str,
+    date_from: date | None = Query(None, alias="from"),
+    date_to: date | None = Query(None, alias="to"),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    return await num_trips_by_person(driver, person_id, date_from, date_to)
+
+@app.get("/sentiment", response_model=SentimentFilterResult, tags=["Sentiment Analysis"])
+async def sentiment(
+    entity_type: list[Literal[Entity.PERSON, Entity.ORGANIZATION]] | None = Query(None),
+    entity_id: list[str] | None = Query(None),
+    topic: list[str] | None = Query(None),
+    industry: list[str] | None = Query(None),
+    polarity: list[Polarity] | None = Query(None),
+    min_sentiment: float | None = None,
+    max_sentiment: float | None = None,
+    dataset: list[GraphMembership] | None = Query(None),
+    exclude_dataset: list[GraphMembership] | None = Query(None),
+    from_meeting: int | None = Query(None, ge=1),
+    to_meeting: int | None = Query(None, ge=1),
+    limit: int | None = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Filter the participation table (one row per PARTICIPANT relationship of a person or organization
+    in a PLAN/DISCUSSION about a topic) and return only the matching rows plus facet counts.
 
-@app.get("/sentiment")
-async def sentiment():
-    pass
+    Different filters are combined with AND, several values of the same filter with OR. Polarity is one of
+    `positive`, `negative`, `neutral` (0) or `none` (no sentiment recorded). Rows must be recorded in all
+    `dataset`s and in none of the `exclude_dataset`s. `from_meeting`/`to_meeting` restrict the rows to
+    activities of the meetings within the (inclusive) range of meeting numbers.
+
+    Facet counts (`entity_type`, `topic`, `industry`, `polarity`, `dataset`) are computed with all filters
+    applied except the one on the facet's own column, so they show how many rows each alternative matches.
+    """
+    table = await sentiment_table.get(driver)
+    return table.filter(
+        entity_types=entity_type, entity_ids=entity_id, topics=topic, industries=industry,
+        polarities=polarity, min_sentiment=min_sentiment, max_sentiment=max_sentiment,
+        datasets=dataset, exclude_datasets=exclude_dataset, from_meeting=from_meeting, to_meeting=to_meeting,
+        limit=limit, offset=offset
+    )
+
+
+@app.get("/sentiment-cube", tags=["Sentiment Analysis"])
+async def sentiment_cube(
+    group_by: list[CubeDimension] | None = Query(None),
+    entity: list[str] | None = Query(None),
+    entity_type: list[Literal[Entity.PERSON, Entity.ORGANIZATION]] | None = Query(None),
+    topic: list[str] | None = Query(None),
+    industry: list[str] | None = Query(None),
+    polarity: list[Polarity] | None = Query(None),
+    dataset: list[Literal['all', 'jo', 'fi', 'tr']] | None = Query(None),
+    drill_through: bool = False,
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Sum, mean and count of the sentiments grouped by any subset of the cube dimensions
+    (`entity`, `entity_type`, `topic`, `industry`, `polarity`, `dataset`), from the cube pre-aggregated
+    when the sentiment table is loaded. No `group_by` returns the grand total.
+
+    Rows are counted once per industry of their topic and `dataset` is exclusive like in
+    `/industry-pro-contra-sentiments`: `all`, `tr` (not in FILAH), `fi` (not in TROUT), else `jo`.
+    The dimension filters restrict the aggregated rows (several values are combined with OR).
+    With `drill_through` every group also lists its contributing participation rows.
+    """
+    table = await sentiment_table.get(driver)
+    filters = {"entity": entity, "entity_type": entity_type, "topic": topic, "industry": industry,
+               "polarity": polarity, "dataset": dataset}
+    return table.cube.group_by(group_by or [], filters, drill_through=drill_through)
 
 
 @app.get("/graph-skeleton")
-async def get_graph_skeleton(driver: AsyncDriver = Depends(get_driver)):
+@coalesce_endpoint
+@cache_endpoint
+async def get_graph_skeleton(layout: bool = True, format: GraphFormat = "rows", driver: AsyncDriver = Depends(get_driver)):
+    """
+    Nodes and links recorded in all datasets. With `layout` every node carries the `x`/`y` position of
+    a precomputed (cached, stable across reloads) force-directed layout of the skeleton.
+    `format=columnar` returns the compact columnar format (see `columnar.columnar_graph`) instead of one object per node/link.
+    """
+    if format == "columnar":
+        graph = await graph_skeleton(driver, columnar_graph_transformer)
+        if layout:
+            graph = await (await graph_layouts.get(driver)).with_position_columns(graph, "skeleton")
+        return graph
+
     serialized_graph = await graph_skeleton(driver)
+    if layout:
+        layouts = await graph_layouts.get(driver)
+        serialized_graph = {**serialized_graph, "nodes": await layouts.with_positions(serialized_graph["nodes"], "skeleton")}
     return serialized_graph
 
 
+@app.get("/graph-overview")
+async def retrieve_graph_overview(
+    view: GraphView = "full",
+    group_by: CoarseGrouping = "label",
+    max_supernodes: int = Query(MAX_SUPERNODES, ge=2, le=200),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Coarsened overview of a graph view (`skeleton`: nodes/links in all datasets, `full`, or one dataset):
+    nodes are collapsed into supernodes by `label`, `meeting`, `place` (zone) or `community`, links into
+    superedges weighted by the number of links. Supernodes report their size, label counts and how many of
+    their members are recorded in each dataset. At most `max_supernodes` are returned, the smallest groups
+    are merged into an `other` supernode. Expand a supernode with `/graph-overview/expand`.
+    """
+    coarsening = await graph_coarsening.get(driver)
+    return (await coarsening.coarse_graph(view, group_by, max_supernodes)).overview()
+
+
+@app.get("/graph-overview/expand")
+async def expand_supernode(
+    supernode: str,
+    view: GraphView = "full",
+    group_by: CoarseGrouping = "label",
+    max_supernodes: int = Query(MAX_SUPERNODES, ge=2, le=200),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Members of a supernode of `/graph-overview` (same parameters) with the links among them and their
+    links to other supernodes, aggregated per supernode (`external_edges`).
+    """
+    coarse = await (await graph_coarsening.get(driver)).coarse_graph(view, group_by, max_supernodes)
+    try:
+        return coarse.expand(supernode)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown supernode '{supernode}'")
+
+
+@app.get("/adjacency-matrix")
+async def retrieve_adjacency_matrix(
+    kind: MatrixKind = "adjacency",
+    view: GraphView = "full",
+    rel_type: list[str] | None = Query(None),
+    label: list[str] | None = Query(None),
+    node_id: list[str] | None = Query(None),
+    order: MatrixOrder = "rcm",
+    value: MatrixValue = "count",
+    format: MatrixFormat = "coo",
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Sparse matrix of a subgraph with server-side reordered rows and columns, ready to be painted.
+
+    `adjacency`: node x node matrix of a graph view, optionally only over links of the given relationship types
+    and between nodes of the given labels / ids; values are link weights (number of datasets recording a link).
+    `entity_topic`: entity x topic matrix of the participations in a view (optionally of the given entity ids),
+    with the number of participations (`value=count`) or the mean sentiment (`value=sentiment`, null if none
+    was recorded) as values.
+
+    Orders: `rcm` (reverse Cuthill–McKee), `spectral` (Fiedler vector), `cluster` (Louvain communities) or `none`.
+    Cells are returned in `coo` (row/col/data) or `csr` (indptr/indices/data) form, along with the bandwidth
+    before and after reordering. Results are computed off the event loop and cached per subgraph (least
+    recently used ones evicted).
+    """
+    matrices = await adjacency_matrices.get(driver)
+    node_ids = [int(n) if n.isdigit() else n for n in node_id] if node_id else None  # place ids are numeric
+    result = await matrices.matrix(kind, view, rel_type, label, node_ids, order, value)
+    return matrices.serialize(result, format)
+
+
+@app.get("/centralities")
+async def retrieve_centralities(
+    dataset: DatasetView = "full",
+    metric: CentralityMetric = "pagerank",
+    node_type: list[Entity] | None = Query(None),
+    limit: int = Query(50, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Nodes ranked by a centrality in the full graph or in the subgraph of one dataset (`jo`, `fi`, `tr`),
+    with all centralities of that view: degree, weighted degree (links weighted by the number of datasets
+    recording them), PageRank and normalized betweenness. Computed once when the data is loaded.
+    """
+    returned = ", ".join(f"n.{centrality_property(m, dataset)} as {m}" for m in CENTRALITY_METRICS)
+    query = f"""
+        MATCH (n:!ROADMAP_PLACE)
+        WHERE n.{centrality_property(metric, dataset)} IS NOT NULL
+        AND ($node_types IS NULL OR labels(n)[0] IN $node_types)
+        RETURN n.id as id, labels(n)[0] as type, {returned}
+        ORDER BY {metric} DESC
+        LIMIT $limit"""
+    return await query_and_results(driver, query, {"node_types": [str(t) for t in node_type] if node_type else None, "limit": limit})
+
+
+@app.get("/communities")
+async def retrieve_communities(
+    dataset: DatasetView = "full",
+    rel_type: list[str] | None = Query(None),
+    projection: CommunityProjection | None = None,
+    resolution: float = Query(1.0, ge=0.01, le=MAX_RESOLUTION),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Communities (Louvain modularity optimization) of the full graph or the subgraph of one dataset
+    (`jo`, `fi`, `tr`), optionally only over the links of the given relationship types (e.g. `PARTICIPANT`).
+
+    With `projection` the communities are detected on the bipartite entity–topic graph (`entity_topic`)
+    or on the entity co-participation network (`co_participation`) instead. Higher `resolution` yields
+    more and smaller communities (rounded to two decimals). Nodes without links are left out; communities are
+    numbered by size. Results are computed off the event loop and cached per parameter combination.
+    """
+    detector = await community_detector.get(driver)
+    return await detector.communities(dataset, rel_type, projection, resolution)
+
+
+@app.get("/dataset-overlap")
+async def dataset_overlap(
+    element: list[ElementKind] | None = Query(None),
+    label: list[str] | None = Query(None),
+    dataset: list[GraphMembership] | None = Query(None),
+    exclude_dataset: list[GraphMembership] | None = Query(None),
+    ids: bool = False,
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Number of nodes per label and of links per relationship type in every dataset membership combination
+    (`jo`, `jo+fi`, `jo+tr`, `jo+fi+tr`), plus the totals per combination, from an index built once from the graph.
+
+    `label` restricts the groups to node labels and/or relationship types, `dataset`/`exclude_dataset` to the
+    combinations containing all / none of the given datasets (e.g. `dataset=fi&exclude_dataset=tr` for `jo+fi`).
+    With `ids` every group also lists its node ids, or the source/target ids of its links.
+    """
+    index = await membership_index.get(driver)
+    return index.overlap(element, label, dataset, exclude_dataset, include_ids=ids)
+
+
 @app.get("/dataset-specific-nodes-edges")
-async def nodes_and_edges_only_in(dataset: GraphMembership, neighbors: bool = False, driver: AsyncDriver = Depends(get_driver)):
+@cache_endpoint
+async def nodes_and_edges_only_in(dataset: GraphMembership, neighbors: bool = False, layout: bool = True,
+                                  format: GraphFormat = "rows", driver: AsyncDriver = Depends(get_driver)):
     # TODO include neighboring node placeholders if graph should be displayed and links
     start_time = time.time()
     graph = await dataset_specific_nodes_and_links(driver, dataset)
+    if format == "columnar":
+        # link endpoints outside the dataset specific nodes are included as `context` nodes
+        result = columnar_graph(graph["nodes"], graph["links"])
+        if layout:
+            result = await (await graph_layouts.get(driver)).with_position_columns(result, dataset)
+        return result
     result = {
         k: [serialize_neo4j_entity(entity) for entity in v] for k, v in graph.items()
     }
+    if layout:
+        # positions from the layout of the whole dataset the nodes belong to
+        layouts = await graph_layouts.get(driver)
+        result["nodes"] = await layouts.with_positions(result["nodes"], dataset)
     print("Query and processing took", round(
         (time.time() - start_time) * 1000), "ms")
     return result
 
 
 @app.get("/retrieve-sentiments", response_model=list[EntityTopicSentiment], tags=["Sentiment Analysis"])
+@coalesce_endpoint
+@cache_endpoint
 async def retrieve_sentiments(driver: AsyncDriver = Depends(get_driver)):
     """
     Retrieve sentiment scores for each entity towards the topics they are connected to.
@@ -223,14 +677,14 @@ async def retrieve_sentiments(driver: AsyncDriver = Depends(get_driver)):
 
 
 def convert_graph_topics(sentiments_by_topic):
-    def _check_condition(condition_name: str, check_against: list):
+    def _check_condition(condition_name: str, check_against: int):
         assert check_against is not None, "Dude wtf"
         evaluate = {
-            "full_graph": "jo" in check_against,
+            "full_graph": in_dataset(check_against, "jo"),
             # "only_trout" : "fi" not in check_against and 'tr' in check_against,
-            "known_in_trout": 'tr' in check_against,
+            "known_in_trout": in_dataset(check_against, "tr"),
             # "only_filah" : "tr" not in check_against and 'fi' in check_against,
-            "known_in_filah": 'fi' in check_against,
+            "known_in_filah": in_dataset(check_against, "fi"),
             # "only_journalist" : check_against == ["jo"]
         }
         return evaluate[condition_name]
@@ -239,7 +693,7 @@ def convert_graph_topics(sentiments_by_topic):
         agg_sentiment_by_industry = {}
         for topic_sentiment_entry in sentiment_dict['topic_sentiments']:
             # TODO loop over conditions here?
-            if _check_condition(condition_name, topic_sentiment_entry['sentiment_recorded_in']):
+            if _check_condition(condition_name, topic_sentiment_entry['sentiment_mask']):
                 related_industries = topic_sentiment_entry['topic_industry']
                 if related_industries is None:
                     continue
@@ -248,7 +702,7 @@ def convert_graph_topics(sentiments_by_topic):
                     sentiment_mean = cur_value[0]
                     new_n = cur_value[1] + 1
                     agg_sentiment_by_industry[industry] = (
-                        (sentiment_mean + topic_sentiment_entry['sentiment']) / new_n, new_n)
+                        sentiment_mean + (topic_sentiment_entry['sentiment'] - sentiment_mean) / new_n, new_n)
         for key in agg_sentiment_by_industry.keys():
             mean, n = agg_sentiment_by_industry[key]
             agg_sentiment_by_industry[key] = {
@@ -271,7 +725,13 @@ def convert_graph_topics(sentiments_by_topic):
 
 
 @app.get("/sentiments-by-industry", tags=["Sentiment Analysis"])
-async def retrieve_sentiments_aggregate_by_industry(driver: AsyncDriver = Depends(get_driver)):
+@coalesce_endpoint
+@cache_endpoint
+async def retrieve_sentiments_aggregate_by_industry(
+    from_meeting: int | None = Query(None, ge=1),
+    to_meeting: int | None = Query(None, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+):
     """
     Retrieve aggregated sentiment scores grouped by industry and filtered by graph context.
 
@@ -288,6 +748,10 @@ async def retrieve_sentiments_aggregate_by_industry(driver: AsyncDriver = Depend
     - The mean sentiment per industry
     - The number of sentiment records contributing to that mean
 
+    With `from_meeting`/`to_meeting` only sentiments first recorded in a meeting within the (inclusive) range
+    of meeting numbers are aggregated. Such windows are answered from prefix sums over the sentiments sorted
+    by meeting (see `timeline`).
+
     Returns:
         dict: A dictionary with keys as condition names and values as lists of per-entity
               industry-level sentiment aggregations. Example structure:
@@ -306,6 +770,9 @@ async def retrieve_sentiments_aggregate_by_industry(driver: AsyncDriver = Depend
             "known_in_filah": [...]
         }
     """
+    if from_meeting is not None or to_meeting is not None:
+        timeline = await sentiment_timeline.get(driver)
+        return timeline.sentiments_by_industry(from_meeting, to_meeting)
     sentiments_by_topic = await entity_topic_participation(driver)
     return convert_graph_topics(sentiments_by_topic)
 
@@ -322,7 +789,13 @@ async def retrieve_sentiments_aggregate_by_industry(driver: AsyncDriver = Depend
     response_description="List of aggregated industry pro contra sentiments per entity-industry group.",
     tags=["Sentiment Analysis"]
 )
-async def retrieve_industry_pro_contra_sentiments(driver: AsyncDriver = Depends(get_driver)) -> list[IndustryProContraSentiment]:
+@coalesce_endpoint
+@cache_endpoint
+async def retrieve_industry_pro_contra_sentiments(
+    from_meeting: int | None = Query(None, ge=1),
+    to_meeting: int | None = Query(None, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+) -> list[IndustryProContraSentiment]:
     """
     Aggregate sentiment values by entity and industry.
 
@@ -336,7 +809,8 @@ async def retrieve_industry_pro_contra_sentiments(driver: AsyncDriver = Depends(
     - `dataset`: Source of sentiment data (`jo`, `fi`, `tr`, or `all`)
     - `industry`: Industry the sentiment relates to
 
-    Sentiments with values of 0 or None are ignored.
+    Sentiments with values of 0 or None are ignored. With `from_meeting`/`to_meeting` only sentiments first
+    recorded in a meeting within the (inclusive) range of meeting numbers are aggregated.
 
     Returns:
         List of dictionaries, each containing:
@@ -348,19 +822,11 @@ async def retrieve_industry_pro_contra_sentiments(driver: AsyncDriver = Depends(
         - `agg_sentiment`: Aggregated sentiment value
         - `contributing_sentiments`: List of original sentiment dicts that contributed
     """
+    if from_meeting is not None or to_meeting is not None:
+        timeline = await sentiment_timeline.get(driver)
+        return timeline.pro_contra_sentiments(from_meeting, to_meeting)
     data = await entity_topic_participation(driver)
 
-    def _check(sentiment_recorded_in):
-        datasets = set(sentiment_recorded_in)
-        if {'jo', 'fi', 'tr'}.issubset(datasets):
-            return 'all'
-        elif 'tr' in datasets and 'fi' not in datasets:
-            return 'tr'
-        elif 'fi' in datasets and 'tr' not in datasets:
-            return 'fi'
-        else:
-            return 'jo'
-
     results = {}
     for entity in data:
         for sentiment in entity['topic_sentiments']:
@@ -369,7 +835,7 @@ async def retrieve_industry_pro_contra_sentiments(driver: AsyncDriver = Depends(
                 continue
             multi_idxs = [  # id, type, sentiment polarity, dataset, industry
                 (entity['entity_id'], entity['entity_type'], sent_val >= 0,
-                    _check(sentiment['sentiment_recorded_in']), industry)
+                    dataset_category(sentiment['sentiment_mask']), industry)
                 for industry in sentiment['topic_industry']
             ]
             for mx in multi_idxs:
@@ -386,7 +852,14 @@ async def retrieve_industry_pro_contra_sentiments(driver: AsyncDriver = Depends(
 
 
 @app.get("/industry-interest-alignment", tags=['Sentiment Analysis'])
-async def retrieve_industry_interest_alignment(weight: bool = False, driver: AsyncDriver = Depends(get_driver)) -> dict[str, dict[str, float | None]]:
+@coalesce_endpoint
+@cache_endpoint
+async def retrieve_industry_interest_alignment(
+    weight: bool = False,
+    from_meeting: int | None = Query(None, ge=1),
+    to_meeting: int | None = Query(None, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+) -> dict[str, dict[str, float | None]]:
     """
     Retrieve a similarity matrix showing how aligned different industries are 
     based on sentiment data from entities.
@@ -397,13 +870,18 @@ async def retrieve_industry_interest_alignment(weight: bool = False, driver: Asy
 
     Args:
         weight (bool): Whether to weight sentiment values by their frequency.
+        from_meeting, to_meeting (int | None): Only use sentiments first recorded in a meeting within this range.
         driver (AsyncDriver): Async Neo4j driver for data retrieval (injected dependency).
 
     Returns:
         pd.DataFrame: A square similarity matrix with industries as both rows and columns.
     """
-    sentiments_by_topic = await entity_topic_participation(driver)
-    data = convert_graph_topics(sentiments_by_topic)['full_graph']
+    if from_meeting is not None or to_meeting is not None:
+        timeline = await sentiment_timeline.get(driver)
+        data = timeline.sentiments_by_industry(from_meeting, to_meeting)['full_graph']
+    else:
+        sentiments_by_topic = await entity_topic_participation(driver)
+        data = convert_graph_topics(sentiments_by_topic)['full_graph']
     data = {k: v for e in data for k, v in e.items()}
     unique_entities = list(data.keys())
     unique_industries = ['tourism', 'small vessel', 'misc', 'large vessel']
@@ -434,15 +912,76 @@ async def retrieve_industry_interest_alignment(weight: bool = False, driver: Asy
     return similarity_matrix.to_dict()
 
 
+@app.get("/similar-stance", tags=["Sentiment Analysis"])
+async def retrieve_similar_stance(
+    entity_id: str,
+    k: int = Query(10, ge=1, le=100),
+    level: StanceLevel = "topic",
+    dataset: GraphMembership | None = None,
+    min_overlap: int = Query(2, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    The `k` persons or organizations whose stances are most similar to the ones of `entity_id`.
+
+    Stances are mean sentiments per topic (`topic`) or per industry (`industry`), optionally only from
+    sentiments recorded in `dataset`. Similarity is the cosine similarity over the topics/industries both
+    entities have sentiments for; matches sharing fewer than `min_overlap` of them are excluded.
+    """
+    table = await sentiment_table.get(driver)
+    try:
+        return table.similar_stances(entity_id, k=k, level=level, dataset=dataset, min_overlap=min_overlap)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No sentiments recorded for entity '{entity_id}'")
+
+
+@app.get("/bias-statistics", tags=["Sentiment Analysis"])
+async def retrieve_bias_statistics(
+    level: BiasLevel = "entity_industry",
+    entity: list[str] | None = Query(None),
+    industry: list[str] | None = Query(None),
+    min_sentiments: int = Query(1, ge=1),
+    resamples: int = Query(BOOTSTRAP_RESAMPLES, ge=100, le=20000),
+    permutations: int = Query(PERMUTATIONS, ge=100, le=20000),
+    confidence: float = Query(0.95, gt=0.5, lt=1),
+    seed: int = Query(0, ge=0),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Bias scores (mean sentiment) per entity (`entity`), per industry (`industry`) or per entity and industry
+    (`entity_industry`) in the full graph (`jo`), FILAH (`fi`) and TROUT (`tr`), with percentile bootstrap
+    confidence intervals. For FILAH and TROUT `bias` is the deviation of their score from the full graph,
+    `fi_minus_tr` the difference between both, each with a bootstrap interval and the two-sided p-value of a
+    permutation test (a small p-value: the difference is unlikely to be noise of the few sentiments).
+
+    Sentiments are the distinct statements counted by `/industry-pro-contra-sentiments`. Results are deterministic
+    for a `seed` and cached until the data changes. `entity`/`industry` restrict the returned groups,
+    `min_sentiments` drops groups with fewer sentiments in the full graph.
+    """
+    statistics = await bias_statistics.get(driver)
+    groups = await statistics.statistics(driver, level, resamples, permutations, confidence, seed)
+    return [
+        group for group in groups
+        if (not entity or group["entity_id"] in entity)
+        and (not industry or group["industry"] in industry)
+        and group["views"]["jo"]["n"] >= min_sentiments
+    ]
+
+
 @app.get("/person-activity-plans")
-async def retrieve_person_activity(person_id: str, driver: AsyncDriver = Depends(get_driver)) -> dict[str, PersonalActivity]:
-    plans, discussions = await personal_activity(driver, person_id)
+async def retrieve_person_activity(
+    person_id: str,
+    from_meeting: int | None = Query(None, ge=1),
+    to_meeting: int | None = Query(None, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+) -> dict[str, PersonalActivity]:
+    plans, discussions = await personal_activity(driver, person_id, from_meeting, to_meeting)
     result = dict()
 
     datasets = ['jo', 'fi', 'tr']
     for ds in datasets:
-        ds_plans = list(filter(lambda node: ds in node['node']['in_graph'] and ds in node["rel_exists_in"], plans))
-        ds_discussions = list(filter(lambda node: ds in node['node']['in_graph'] and ds in node["rel_exists_in"], discussions))
+        ds_plans = list(filter(lambda node: in_dataset(node['node']['in_graph_mask'] & node['rel_mask'], ds), plans))
+        ds_discussions = list(filter(lambda node: in_dataset(node['node']['in_graph_mask'] & node['rel_mask'], ds), discussions))
         result[ds] = {
             "num_plans" : len(ds_plans),
             "num_discussions": len(ds_discussions),
@@ -456,8 +995,78 @@ async def retrieve_person_activity(person_id: str, driver: AsyncDriver = Depends
     return result
 
 
+@app.get("/co-locations")
+async def retrieve_co_locations(
+    window_minutes: int = Query(60, ge=0, le=7 * 24 * 60),
+    dataset: GraphMembership | None = None,
+    person_id: str | None = None,
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Pairs of persons that visited the same place within `window_minutes` of each other.
+
+    Only visits whose TOOK and VISIT relationships are contained in `dataset` are considered if it is given.
+    Each result lists the place, both persons and every encounter (visit times, trips and gap),
+    pairs with the most encounters first. Optionally restricted to pairs involving `person_id`.
+    """
+    engine = await colocation_engine.get(driver)
+    results = engine.find(window_minutes, dataset)
+    if person_id is not None:
+        results = [r for r in results if person_id in (r["person_a"], r["person_b"])]
+    return results
+
+
+@app.get("/co-participation-network", tags=["Sentiment Analysis"])
+async def retrieve_co_participation_network(
+    weight: ProjectionWeight = "topics",
+    dataset: GraphMembership | None = None,
+    min_weight: float = Query(1, ge=0),
+    top_k: int | None = Query(None, ge=1),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Entity x entity network projected from the PLAN/DISCUSSION participations of persons and organizations.
+
+    Edge weights count shared topics (`topics`), shared meetings (`meetings`) or topics both entities
+    have the same stance on (`stance`). Participations can be restricted to a dataset, edges lighter than
+    `min_weight` are dropped and `top_k` caps the number of strongest neighbors kept per entity.
+    """
+    projection = await co_participation.get(driver)
+    return projection.network(weight, dataset, min_weight=min_weight, top_k=top_k)
+
+
+@app.get("/export/{table}", tags=["Export"])
+async def export_table(
+    table: ExportTable,
+    format: ExportFormat = "arrow",
+    columns: list[str] | None = Query(None),
+    driver: AsyncDriver = Depends(get_driver)
+):
+    """
+    Streams a flat table for offline analysis as Arrow IPC stream (`arrow`) or zstd compressed Parquet (`parquet`).
+
+    - `participation`: one row per entity, topic and PLAN/DISCUSSION participation with sentiment, reason,
+      dataset membership and industries
+    - `nodes`: all nodes except ROADMAP_PLACE, remaining properties as JSON string
+    - `edges`: all relationships between them, remaining properties as JSON string
+
+    `columns` selects (and orders) the exported columns.
+    """
+    try:
+        export_schema(table, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    extension = "arrows" if format == "arrow" else "parquet"
+    return StreamingResponse(
+        stream_export(driver, table, format, columns),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'}
+    )
+
+
 @app.get("/ego-network")
-async def retrieve_ego_network(node_id: str, node_type: str, driver: AsyncDriver = Depends(get_driver)):
+async def retrieve_ego_network(node_id: str, node_type: str, format: GraphFormat = "rows", driver: AsyncDriver = Depends(get_driver)):
     assert node_type in ["ENTITY_PERSON", "ENTITY_ORGANIZATION", "TOPIC"]
-    result = await ego_network(driver, node_id, node_type)
+    transformer = columnar_graph_transformer if format == "columnar" else serializable_graph_transformer
+    result = await ego_network(driver, node_id, node_type, transformer)
     return result
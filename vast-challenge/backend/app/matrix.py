@@ -0,0 +1,201 @@
+import asyncio
+from typing import Literal
+
+import numpy as np
+import scipy.sparse as sp
+from neo4j import AsyncDriver
+from scipy.sparse.csgraph import connected_components, laplacian, reverse_cuthill_mckee
+from scipy.sparse.linalg import eigsh
+
+from .coalescing import SingleFlight
+from .communities import louvain
+from .graph_analytics import GraphArrays, GraphView, graph_arrays, in_view
+from .result_cache import ResultCache
+from .sentiment_table import SentimentTable, sentiment_table
+from .utils import LazyIndex
+
+MatrixKind = Literal["adjacency", "entity_topic"]
+MatrixOrder = Literal["none", "rcm", "spectral", "cluster"]
+MatrixValue = Literal["count", "sentiment"]
+MatrixFormat = Literal["coo", "csr"]
+
+# largest component for which the Fiedler vector is computed with a dense eigendecomposition
+DENSE_EIGEN_LIMIT = 1500
+# memory budget of the cached reordered matrices (subgraphs are client input, e.g. lists of node ids)
+MATRIX_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+def _fiedler_order(matrix: sp.csr_matrix) -> np.ndarray:
+    """Order of the nodes of a connected graph by their entry in the Fiedler vector of the normalized Laplacian."""
+    n = matrix.shape[0]
+    if n < 3:
+        return np.arange(n)
+    lap = laplacian(matrix, normed=True)
+    if n <= DENSE_EIGEN_LIMIT:
+        _, vectors = np.linalg.eigh(lap.toarray())
+    else:
+        _, vectors = eigsh(lap.tocsc(), k=2, sigma=-1e-3, which="LM")
+    fiedler = vectors[:, 1]
+    # fix the sign so that the order is deterministic
+    if fiedler[np.argmax(np.abs(fiedler))] < 0:
+        fiedler = -fiedler
+    return np.argsort(fiedler, kind="stable")
+
+
+def seriation(matrix: sp.csr_matrix, order: MatrixOrder) -> np.ndarray:
+    """
+    Permutation of the rows/columns of a symmetric sparse matrix that brings structure to its diagonal:
+    - `rcm`: reverse Cuthill–McKee, minimizing the bandwidth
+    - `spectral`: per connected component (largest first) by the Fiedler vector of the Laplacian
+    - `cluster`: by Louvain community (largest first), within a community by decreasing degree
+    - `none`: unchanged
+    """
+    n = matrix.shape[0]
+    if order == "none" or n == 0:
+        return np.arange(n)
+    if order == "rcm":
+        return reverse_cuthill_mckee(matrix, symmetric_mode=True).astype(int)
+    if order == "spectral":
+        num_components, component_of = connected_components(matrix, directed=False)
+        sizes = np.bincount(component_of)
+        permutation = []
+        for component in np.argsort(-sizes, kind="stable"):
+            members = np.flatnonzero(component_of == component)
+            permutation.append(members[_fiedler_order(matrix[members][:, members])])
+        return np.concatenate(permutation)
+    communities = louvain(matrix)
+    degrees = np.asarray(matrix.sum(axis=1)).ravel()
+    return np.lexsort((-degrees, communities))
+
+
+def _values(data: np.ndarray) -> list:
+    return [None if np.isnan(v) else float(v) for v in data]
+
+
+def bandwidth(matrix: sp.csr_matrix) -> int:
+    coo = matrix.tocoo()
+    return int(np.abs(coo.row - coo.col).max()) if coo.nnz else 0
+
+
+class AdjacencyMatrices:
+    """
+    Sparse adjacency matrices of subgraphs (a graph view, optionally only some relationship types, node labels
+    or node ids) and entity x topic matrices, with their rows/columns reordered by a seriation.
+    Reordered matrices are computed in a worker thread (once for concurrent identical requests) and cached per subgraph
+    key, least recently used ones evicted beyond a memory budget.
+
+    Entity x topic matrices are reordered through their bipartite graph, so rows and columns get
+    consistent orders; values are the number of participations or the mean sentiment.
+    """
+
+    def __init__(self, graph: GraphArrays, table: SentimentTable):
+        self.graph = graph
+        self.table = table
+        self._cache = ResultCache("adjacency-matrices", max_bytes=MATRIX_CACHE_MAX_BYTES)
+        self._flights = SingleFlight("adjacency-matrices")
+
+    def _adjacency(self, view: GraphView, rel_types: tuple, labels: tuple, node_ids: tuple):
+        nodes, matrix = self.graph.adjacency(view, list(rel_types) or None)
+        keep = np.ones(len(nodes), dtype=bool)
+        if labels:
+            keep &= np.isin(self.graph.labels[nodes], labels)
+        if node_ids:
+            keep &= np.isin(self.graph.ids[nodes], np.array(node_ids, dtype=object))
+        keep = np.flatnonzero(keep)
+        nodes, matrix = nodes[keep], matrix[keep][:, keep].tocsr()
+        ids, types = self.graph.ids[nodes], self.graph.labels[nodes]
+        return ids, types, ids, types, matrix, matrix
+
+    def _entity_topic(self, view: GraphView, value: MatrixValue, node_ids: tuple):
+        table = self.table
+        rows = np.flatnonzero(in_view(table.membership, view))
+        if node_ids:
+            rows = rows[np.isin(np.array(table.entities, dtype=object)[table.entity_codes[rows]],
+                                np.array(node_ids, dtype=object))]
+        shape = (len(table.entities), len(table.topics))
+        cells, cell_of_row = np.unique(
+            np.stack([table.entity_codes[rows], table.topic_codes[rows]], axis=1).reshape(-1, 2),
+            axis=0, return_inverse=True)
+        cell_of_row = cell_of_row.ravel()
+        num_participations = np.bincount(cell_of_row, minlength=len(cells)).astype(float)
+        counts = sp.csr_matrix((num_participations, (cells[:, 0], cells[:, 1])), shape=shape)
+        if value == "sentiment":
+            sentiment = table.sentiment[rows]
+            observed = ~np.isnan(sentiment)
+            sums = np.bincount(cell_of_row, weights=np.where(observed, sentiment, 0), minlength=len(cells))
+            num = np.bincount(cell_of_row, weights=observed, minlength=len(cells))
+            # explicit entries for every participation cell: mean sentiment, NaN if none was recorded
+            means = np.divide(sums, num, out=np.full(len(cells), np.nan), where=num > 0)
+            values = sp.csr_matrix((means, (cells[:, 0], cells[:, 1])), shape=shape)
+        else:
+            values = counts
+        used_entities = np.flatnonzero(counts.getnnz(axis=1))
+        used_topics = np.flatnonzero(counts.getnnz(axis=0))
+        counts, values = counts[used_entities][:, used_topics], values[used_entities][:, used_topics]
+        entity_ids = np.array(table.entities, dtype=object)[used_entities]
+        topic_ids = np.array(table.topics, dtype=object)[used_topics]
+        return (entity_ids, [table.entity_types[e] for e in entity_ids], topic_ids, ["TOPIC"] * len(topic_ids),
+                counts.tocsr(), values.tocsr())
+
+    def _compute(self, kind: MatrixKind, view: GraphView, rel_types: tuple, labels: tuple, node_ids: tuple,
+                 order: MatrixOrder, value: MatrixValue) -> dict:
+        if kind == "adjacency":
+            row_ids, row_types, col_ids, col_types, structure, values = self._adjacency(view, rel_types, labels, node_ids)
+            permutation = seriation(structure, order)
+            row_order = col_order = permutation
+        else:
+            row_ids, row_types, col_ids, col_types, structure, values = self._entity_topic(view, value, node_ids)
+            num_rows = structure.shape[0]
+            bipartite = sp.bmat([[None, structure], [structure.T, None]], format="csr")
+            permutation = seriation(bipartite, order)
+            row_order = permutation[permutation < num_rows]
+            col_order = permutation[permutation >= num_rows] - num_rows
+        reordered = values[row_order][:, col_order].tocsr()
+        return {
+            "rows": [{"id": row_ids[i], "type": row_types[i]} for i in row_order],
+            "columns": [{"id": col_ids[i], "type": col_types[i]} for i in col_order],
+            "matrix": reordered,
+            "bandwidth": {
+                "original": bandwidth(structure),
+                "reordered": bandwidth(structure[row_order][:, col_order]),
+            },
+        }
+
+    async def matrix(self, kind: MatrixKind = "adjacency", view: GraphView = "full", rel_types: list[str] | None = None,
+                     labels: list[str] | None = None, node_ids: list | None = None, order: MatrixOrder = "rcm",
+                     value: MatrixValue = "count") -> dict:
+        rel_types, labels = tuple(sorted(set(rel_types or []))), tuple(sorted(set(labels or [])))
+        node_ids = tuple(sorted(set(node_ids or []), key=str))
+        key = (kind, view, rel_types, labels, node_ids, order, value)
+        hit, result = self._cache.get(key)
+        if not hit:
+            result = await self._flights.do(key, lambda: self._compute_and_cache(key))
+        return result
+
+    async def _compute_and_cache(self, key: tuple) -> dict:
+        result = await asyncio.to_thread(self._compute, *key)
+        self._cache.put(key, result)
+        return result
+
+    def serialize(self, result: dict, fmt: MatrixFormat = "coo") -> dict:
+        matrix = result["matrix"]
+        if fmt == "csr":
+            cells = {"indptr": matrix.indptr.tolist(), "indices": matrix.indices.tolist(), "data": _values(matrix.data)}
+        else:
+            coo = matrix.tocoo()
+            cells = {"row": coo.row.tolist(), "col": coo.col.tolist(), "data": _values(coo.data)}
+        return {
+            "rows": result["rows"],
+            "columns": result["columns"],
+            "shape": list(matrix.shape),
+            "format": fmt,
+            **cells,
+            "bandwidth": result["bandwidth"],
+        }
+
+
+async def build_adjacency_matrices(driver: AsyncDriver) -> AdjacencyMatrices:
+    return AdjacencyMatrices(await graph_arrays.get(driver), await sentiment_table.get(driver))
+
+
+adjacency_matrices = LazyIndex("adjacency-matrices", build_adjacency_matrices)
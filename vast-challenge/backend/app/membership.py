@@ -0,0 +1,85 @@
+from collections import Counter, defaultdict
+from typing import Literal
+
+import numpy as np
+from neo4j import AsyncDriver
+
+from .graph_analytics import GraphArrays, graph_arrays
+from .utils import DATASET_BITS, LazyIndex, masks_matching
+
+ElementKind = Literal["nodes", "links"]
+ELEMENT_KINDS: tuple[str, ...] = ElementKind.__args__
+
+
+def membership_name(mask: int) -> str:
+    """Name of a dataset membership combination, e.g. `jo+fi` for mask 3."""
+    return "+".join(dataset for dataset, bit in DATASET_BITS.items() if mask & bit) or "none"
+
+
+class MembershipIndex:
+    """
+    Nodes grouped by label and links grouped by relationship type, each further split by their exact dataset
+    membership combination (`jo`, `jo+fi`, `jo+tr`, `jo+fi+tr`, ...). Groups keep the positions of their elements
+    in the graph arrays, so counts are known up front and id lists are only materialized when asked for.
+    """
+
+    def __init__(self, graph: GraphArrays):
+        self.graph = graph
+        self.groups = {
+            "nodes": self._group(graph.labels, graph.node_masks),
+            "links": self._group(graph.rel_types, graph.link_masks),
+        }
+
+    @staticmethod
+    def _group(keys: np.ndarray, masks: np.ndarray) -> dict[tuple[str, int], np.ndarray]:
+        groups = defaultdict(list)
+        for i, (key, mask) in enumerate(zip(keys, masks)):
+            groups[(key, int(mask))].append(i)
+        return {group: np.array(positions) for group, positions in sorted(groups.items())}
+
+    def _ids(self, kind: ElementKind, positions: np.ndarray) -> list:
+        graph = self.graph
+        if kind == "nodes":
+            return graph.ids[positions].tolist()
+        return [{"source": graph.ids[graph.sources[l]], "target": graph.ids[graph.targets[l]]} for l in positions]
+
+    def overlap(
+        self,
+        kinds: list[ElementKind] | None = None,
+        labels: list[str] | None = None,
+        datasets: list[str] | None = None,
+        exclude_datasets: list[str] | None = None,
+        include_ids: bool = False,
+    ) -> dict:
+        """
+        Per element kind the groups (label or relationship type, membership combination) with their counts
+        and the totals per membership combination. Groups can be restricted to some labels/relationship types
+        and to the combinations containing all `datasets` and none of `exclude_datasets`. With `include_ids`
+        every group lists its node ids (links as source/target ids).
+        """
+        masks = set(masks_matching(datasets or [], exclude_datasets or []))
+        result = {}
+        for kind in kinds or ELEMENT_KINDS:
+            groups, totals = [], Counter()
+            for (label, mask), positions in self.groups[kind].items():
+                if (labels and label not in labels) or mask not in masks:
+                    continue
+                group = {
+                    "label": label,
+                    "membership": membership_name(mask),
+                    "in_graph_mask": mask,
+                    "count": len(positions),
+                }
+                if include_ids:
+                    group["ids"] = self._ids(kind, positions)
+                groups.append(group)
+                totals[group["membership"]] += len(positions)
+            result[kind] = {"groups": groups, "totals": dict(totals)}
+        return result
+
+
+async def build_membership_index(driver: AsyncDriver) -> MembershipIndex:
+    return MembershipIndex(await graph_arrays.get(driver))
+
+
+membership_index = LazyIndex("membership", build_membership_index)
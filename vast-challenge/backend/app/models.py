@@ -1,5 +1,5 @@
 from enum import StrEnum
-from typing import Literal
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
@@ -71,4 +71,47 @@ class PersonalActivity(BaseModel):
     unique_meetings: list[str]
     unique_topics: list[str]
     plans: list[dict]
-    discussions: list[dict]
\ No newline at end of file
+    discussions: list[dict]
+
+
+class SearchHit(BaseModel):
+    id: str | int
+    label: str
+    name: str | None
+    in_graph: list[GraphMembership]
+    score: float
+
+
+class SentimentRow(BaseModel):
+    entity_id: str | int
+    entity_type: Entity
+    topic_id: str
+    activity_id: str
+    activity_type: Entity
+    sentiment: float | None
+    reason: str | None
+    in_graph: list[GraphMembership]
+    industry: list[str]
+    meeting: int | None = None
+
+
+class SentimentFilterResult(BaseModel):
+    total: int
+    rows: list[SentimentRow]
+    facets: dict[str, dict[str, int]]
+
+
+class BatchItem(BaseModel):
+    path: str
+    params: dict[str, Any] = {}
+
+
+class BatchRequest(BaseModel):
+    requests: list[BatchItem] = Field(max_length=50)
+
+
+class BatchResult(BaseModel):
+    path: str
+    params: dict[str, Any]
+    status: int
+    body: Any
@@ -0,0 +1,140 @@
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from urllib.parse import parse_qs
+
+# share of requests that are profiled without asking for it (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+PROFILE_BUFFER_SIZE = int(os.getenv('PROFILE_BUFFER_SIZE', 50))
+PROFILE_HEADER = b"x-profile"
+
+profiles: deque["RequestProfile"] = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profile_ids = itertools.count(1)
+
+# profile of the request currently being served, used by `crud` to account database wait time
+current_profile: ContextVar["RequestProfile | None"] = ContextVar("current_profile", default=None)
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class RequestProfile:
+    """
+    Samples the stack of the event loop thread in a background thread while a request is served.
+
+    A sample whose innermost frame is the selector of the event loop is counted as waiting
+    (in this backend: mostly for the database), every other sample as Python work. Stacks are
+    aggregated in the folded format (`root;...;leaf count`) understood by flame-graph tools,
+    with `db_wait` or `python` as root frame.
+    NOTE: the event loop is shared, so work of concurrently served requests ends up in the samples, too.
+    """
+
+    def __init__(self, path: str, query_string: str, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.id = next(_profile_ids)
+        self.path = path
+        self.query_string = query_string
+        self.interval = interval_ms / 1000
+        self.started_at = datetime.now()
+        self.stacks: Counter[str] = Counter()
+        self.db_wait_ms = 0.0
+        self.duration_ms = None
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True, name=f"profiler-{self.id}")
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < 128:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            kind = "db_wait" if stack[0].startswith("selectors:") else "python"
+            self.stacks[";".join([kind, *reversed(stack)])] += 1
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 1)
+
+    def add_db_wait(self, seconds: float):
+        self.db_wait_ms += seconds * 1000
+
+    def summary(self) -> dict:
+        by_kind = Counter()
+        for stack, count in self.stacks.items():
+            by_kind[stack.split(";", 1)[0]] += count
+        return {
+            "id": self.id,
+            "path": self.path,
+            "query_string": self.query_string,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "db_query_ms": round(self.db_wait_ms, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": {"db_wait": by_kind["db_wait"], "python": by_kind["python"]},
+        }
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), "stacks": dict(self.stacks.most_common())}
+
+
+def get_profile(profile_id: int) -> RequestProfile | None:
+    return next((p for p in profiles if p.id == profile_id), None)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests that ask for it (`X-Profile: 1` header or `profile=1` query parameter)
+    and a random `PROFILE_SAMPLE_RATE` share of all other requests. Finished profiles are kept in a
+    bounded ring buffer and their id is returned in the `X-Profile-Id` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope) -> bool:
+        if scope["path"].startswith("/debug/"):
+            return False
+        if dict(scope["headers"]).get(PROFILE_HEADER) in (b"1", b"true"):
+            return True
+        if parse_qs(scope["query_string"].decode()).get("profile", [None])[0] in ("1", "true"):
+            return True
+        return random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["path"], scope["query_string"].decode())
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", str(profile.id).encode())]
+            await send(message)
+
+        token = current_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            profile.stop()
+            current_profile.reset(token)
+            profiles.append(profile)
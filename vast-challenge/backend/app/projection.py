@@ -0,0 +1,122 @@
+from typing import Literal
+
+import numpy as np
+from neo4j import AsyncDriver
+from scipy import sparse
+
+from .crud import query_and_results
+from .utils import LazyIndex, in_dataset
+
+ProjectionWeight = Literal["topics", "meetings", "stance"]
+
+
+class CoParticipationProjection:
+    """
+    Entity x entity co-participation network, computed as the sparse product B·Bᵀ of an
+    entity x item incidence matrix B (items being topics or meetings).
+
+    - `topics`: edge weight = number of topics both entities participated in
+    - `meetings`: edge weight = number of meetings both entities participated in
+    - `stance`: edge weight = number of topics both entities have the same (non-neutral) mean sentiment on,
+      i.e. P·Pᵀ + N·Nᵀ with P/N being the incidences of positive/negative stances
+
+    Projections are cached per (weight, dataset); thresholds and neighbor caps are applied on the cached matrix.
+    """
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.entity_ids = sorted({r["entity_id"] for r in rows}, key=str)
+        self.entity_idx = {eid: i for i, eid in enumerate(self.entity_ids)}
+        self.entity_types = {r["entity_id"]: r["entity_type"] for r in rows}
+        self._cache: dict[tuple, sparse.csr_matrix] = {}
+
+    def _incidence(self, pairs) -> sparse.csr_matrix:
+        """Binary entity x item incidence matrix from (entity_id, item) pairs."""
+        items = {}
+        row_idx, col_idx = [], []
+        for entity_id, item in pairs:
+            row_idx.append(self.entity_idx[entity_id])
+            col_idx.append(items.setdefault(item, len(items)))
+        shape = (len(self.entity_ids), max(len(items), 1))
+        incidence = sparse.csr_matrix((np.ones(len(row_idx)), (row_idx, col_idx)), shape=shape)
+        incidence.data[:] = 1.0  # several plans/discussions on the same item count once
+        return incidence
+
+    def _stance_incidences(self, rows: list[dict]) -> tuple[sparse.csr_matrix, sparse.csr_matrix]:
+        sentiments = {}
+        for r in rows:
+            if r["sentiment"] is not None:
+                sentiments.setdefault((r["entity_id"], r["topic_id"]), []).append(r["sentiment"])
+        means = {key: np.mean(values) for key, values in sentiments.items()}
+        positive = self._incidence(key for key, mean in means.items() if mean > 0)
+        negative = self._incidence(key for key, mean in means.items() if mean < 0)
+        return positive, negative
+
+    def matrix(self, weight: ProjectionWeight, dataset: str | None) -> sparse.csr_matrix:
+        key = (weight, dataset)
+        if key not in self._cache:
+            rows = self.rows if dataset is None else [r for r in self.rows if in_dataset(r["in_graph_mask"], dataset)]
+            if weight == "stance":
+                positive, negative = self._stance_incidences(rows)
+                projection = positive @ positive.T + negative @ negative.T
+            else:
+                item_key = "topic_id" if weight == "topics" else "meeting_id"
+                incidence = self._incidence((r["entity_id"], r[item_key]) for r in rows if r[item_key] is not None)
+                projection = incidence @ incidence.T
+            projection = sparse.csr_matrix(projection)
+            projection.setdiag(0)
+            projection.eliminate_zeros()
+            self._cache[key] = projection
+        return self._cache[key]
+
+    def network(self, weight: ProjectionWeight, dataset: str | None = None,
+                min_weight: float = 1, top_k: int | None = None) -> dict:
+        """
+        Returns the projection as nodes and undirected weighted edges.
+        Edges lighter than `min_weight` are dropped; with `top_k` an edge is kept only if it is
+        among the `top_k` heaviest edges of at least one of its endpoints.
+        """
+        projection = self.matrix(weight, dataset)
+        coo = sparse.triu(projection, k=1).tocoo()
+        keep = coo.data >= min_weight
+        sources, targets, weights = coo.row[keep], coo.col[keep], coo.data[keep]
+
+        if top_k is not None and len(weights):
+            # rank each edge within the neighborhoods of both endpoints
+            order = np.argsort(-weights, kind="stable")
+            rank_in = np.zeros(len(weights), dtype=bool)
+            seen = np.zeros(len(self.entity_ids), dtype=int)
+            for edge in order:
+                s, t = sources[edge], targets[edge]
+                if seen[s] < top_k or seen[t] < top_k:
+                    rank_in[edge] = True
+                seen[s] += 1
+                seen[t] += 1
+            sources, targets, weights = sources[rank_in], targets[rank_in], weights[rank_in]
+
+        connected = np.unique(np.concatenate([sources, targets]))
+        return {
+            "nodes": [
+                {"id": self.entity_ids[i], "type": self.entity_types[self.entity_ids[i]],
+                 "num_co_participants": int(projection[i].nnz)}
+                for i in connected
+            ],
+            "edges": [
+                {"source": self.entity_ids[s], "target": self.entity_ids[t], "weight": float(w)}
+                for s, t, w in zip(sources, targets, weights)
+            ],
+        }
+
+
+async def build_co_participation_projection(driver: AsyncDriver) -> CoParticipationProjection:
+    query = """
+        MATCH (t:TOPIC)--(pd:PLAN | DISCUSSION)-[p:PARTICIPANT]-(e:ENTITY_PERSON | ENTITY_ORGANIZATION)
+        OPTIONAL MATCH (pd)--(m:MEETING)
+        RETURN e.id as entity_id, labels(e)[0] as entity_type, t.id as topic_id,
+            m.id as meeting_id, p.sentiment as sentiment, p.in_graph_mask as in_graph_mask
+    """
+    records = await query_and_results(driver, query, cache=False)
+    return CoParticipationProjection([dict(record) for record in records])
+
+
+co_participation = LazyIndex("co-participation", build_co_participation_projection)
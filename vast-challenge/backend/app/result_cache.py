@@ -0,0 +1,204 @@
+import asyncio
+import functools
+import inspect
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+import numpy as np
+import scipy.sparse as sp
+from neo4j import AsyncDriver, Record
+from neo4j.graph import Graph, Node, Relationship
+
+from .coalescing import canonical_params
+
+# memory budget of cached query results (estimated), least recently used results are evicted beyond it
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# default time to live (seconds) of cached results, 0: until evicted or the data changes
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', 0))
+# how often (seconds) the data version is read from the database while results are cached
+DATA_VERSION_CHECK_INTERVAL = float(os.getenv('DATA_VERSION_CHECK_INTERVAL', 30))
+
+
+def estimate_size(value: Any, _seen: set | None = None) -> int:
+    """
+    Approximate memory footprint of a query result in bytes: the object and everything it references
+    (containers, records, nodes, relationships and graphs, NumPy arrays and sparse matrices), objects
+    referenced several times counted once.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if sp.issparse(value):
+        return sys.getsizeof(value) + sum(
+            getattr(value, part).nbytes for part in ("data", "indices", "indptr", "row", "col") if hasattr(value, part))
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (value.nbytes if value.base is not None else 0)
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, Graph):
+        return size + estimate_size(value._nodes, seen) + estimate_size(value._relationships, seen)
+    if isinstance(value, (Node, Relationship)):
+        size += estimate_size(value._properties, seen) + estimate_size(value.element_id, seen)
+        if isinstance(value, Node):
+            return size + estimate_size(value._labels, seen)
+        return size + estimate_size(value.type, seen)
+    if isinstance(value, Record):
+        return size + sum(estimate_size(v, seen) for v in value.values())
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(v, seen) for v in value)
+    return size
+
+
+class ResultCache:
+    """
+    Query results by key, bounded by their estimated total size in bytes: the least recently used results
+    are evicted once the budget is exceeded (results larger than the whole budget are not cached at all).
+    Results can expire after a time to live. Like coalesced results, cached results are shared by all
+    callers and must not be mutated.
+    """
+
+    def __init__(self, name: str, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[Any, int, float | None]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        """`(True, result)` for a cached result (which becomes the most recently used one), else `(False, None)`."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+
+    def put(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Caches a result, for `ttl` seconds if given (else the default `RESULT_CACHE_TTL`, 0: no expiry)."""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        ttl = RESULT_CACHE_TTL if ttl is None else ttl
+        self._entries[key] = (value, size, time.monotonic() + ttl if ttl > 0 else None)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class DataVersion:
+    """
+    Version of the data in the database, used to drop cached results once the data changes. It is the
+    number of nodes and relationships (cheap count store lookups), read at most every
+    `DATA_VERSION_CHECK_INTERVAL` seconds. Changes made by the backend itself are announced with `bump`.
+    """
+
+    def __init__(self, cache: ResultCache, check_interval: float = DATA_VERSION_CHECK_INTERVAL):
+        self.cache = cache
+        self.check_interval = check_interval
+        self.version: tuple | None = None
+        self.changes = 0
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def _read(self, driver: AsyncDriver) -> tuple:
+        nodes, _, _ = await driver.execute_query("MATCH (n) RETURN count(n) as count")
+        relationships, _, _ = await driver.execute_query("MATCH ()-[r]->() RETURN count(r) as count")
+        return nodes[0]["count"], relationships[0]["count"]
+
+    async def current(self, driver: AsyncDriver) -> tuple | None:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            async with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    version = await self._read(driver)
+                    self._checked_at = time.monotonic()
+                    if version != self.version:
+                        if self.version is not None:
+                            print(f"Data version changed from {self.version} to {version}, dropping cached results")
+                            self.changes += 1
+                        self.cache.clear()
+                        self.version = version
+        return self.version
+
+    def bump(self):
+        """Drops all cached results and re-reads the version on the next lookup."""
+        self.cache.clear()
+        self.changes += 1
+        self._checked_at = float("-inf")
+
+    def stats(self) -> dict:
+        return {"version": self.version, "changes": self.changes}
+
+
+result_cache = ResultCache("query-results")
+data_version = DataVersion(result_cache)
+
+
+def cache_endpoint(endpoint: Callable[..., Awaitable[Any]]):
+    """
+    Decorator for endpoints whose response only depends on their parameters and the data: the transformed
+    response is kept in `result_cache` until it is evicted or the data changes, so work done once (e.g. by the
+    warm-up) is reused by later requests. Parameters a direct caller leaves out count with their defaults.
+    The driver dependency is not part of the key.
+    """
+    signature = inspect.signature(endpoint)
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        driver = bound.arguments.get("driver")
+        params = {k: v for k, v in bound.arguments.items() if k != "driver"}
+        key = ("endpoint", endpoint.__qualname__, canonical_params(params))
+        await data_version.current(driver)
+        hit, result = result_cache.get(key)
+        if not hit:
+            result = await endpoint(*args, **kwargs)
+            result_cache.put(key, result)
+        return result
+    return wrapper
+
+
+def result_cache_metrics() -> dict:
+    return {**result_cache.stats(), "data_version": data_version.stats()}
@@ -0,0 +1,167 @@
+import asyncio
+import math
+from collections import defaultdict
+
+import numpy as np
+from neo4j import AsyncDriver
+
+from .crud import query_and_results
+from .utils import LazyIndex
+
+# zoom levels for which simplified geometries are precomputed; deeper zooms get the full resolution
+SIMPLIFICATION_ZOOMS = (8, 10, 12, 14)
+# maximum deviation of a simplified line from the original, in screen pixels
+TOLERANCE_PX = 1.0
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Size of `TOLERANCE_PX` screen pixels in degrees at a web map zoom level (256px tiles)."""
+    return TOLERANCE_PX * 360 / (256 * 2 ** zoom)
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplifies a polyline (n x 2 array of lon/lat) with the Douglas–Peucker algorithm, iteratively
+    and with vectorized point-segment distances. Longitudes are scaled by the cosine of the mean latitude
+    so the tolerance is (approximately) isotropic.
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return points
+    scaled = points * np.array([math.cos(math.radians(points[:, 1].mean())), 1.0])
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = scaled[end] - scaled[start]
+        inner = scaled[start + 1:end] - scaled[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def build_strokes(coordinates: dict, routes: list[tuple], max_turn_degrees: float = 45) -> list[list]:
+    """
+    Decomposes the road graph into strokes: polylines that follow a road through junctions as long as
+    there is an unused route continuing with a turn of at most `max_turn_degrees` (the straightest one
+    is taken). Every route ends up in exactly one stroke. Strokes are grown in both directions,
+    starting from dead ends first. Returns each stroke as list of place ids.
+    """
+    neighbors = defaultdict(set)
+    for a, b in routes:
+        if a in coordinates and b in coordinates and a != b:
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+
+    used = set()
+    max_turn = math.radians(max_turn_degrees)
+
+    def _heading(a, b):
+        (x1, y1), (x2, y2) = coordinates[a], coordinates[b]
+        return math.atan2(y2 - y1, (x2 - x1) * math.cos(math.radians(y1)))
+
+    def _extend(line: list):
+        while True:
+            previous, current = line[-2], line[-1]
+            heading = _heading(previous, current)
+            best, best_turn = None, max_turn
+            for candidate in neighbors[current]:
+                if frozenset((current, candidate)) in used:
+                    continue
+                turn = abs((_heading(current, candidate) - heading + math.pi) % (2 * math.pi) - math.pi)
+                if turn <= best_turn:
+                    best, best_turn = candidate, turn
+            if best is None:
+                return line
+            used.add(frozenset((current, best)))
+            line.append(best)
+
+    strokes = []
+    starts = sorted(neighbors, key=lambda node: len(neighbors[node]) != 1)  # dead ends first
+    for node in starts:
+        for neighbor in neighbors[node]:
+            if frozenset((node, neighbor)) in used:
+                continue
+            used.add(frozenset((node, neighbor)))
+            forward = _extend([node, neighbor])
+            backward = _extend([neighbor, node])
+            strokes.append(backward[:1:-1] + forward)
+    return strokes
+
+
+class RoadNetwork:
+    """
+    Road network strokes, pre-simplified for each of the `SIMPLIFICATION_ZOOMS` at construction.
+    Strokes whose extent is below the tolerance of a level are not drawn at that level at all.
+    """
+
+    def __init__(self, coordinates: dict, routes: list[tuple]):
+        strokes = build_strokes(coordinates, routes)
+        self.full = [np.array([coordinates[place] for place in line], dtype=float) for line in strokes]
+        self.bounds = np.array([[*line.min(axis=0), *line.max(axis=0)] for line in self.full]).reshape(-1, 4)
+        extents = np.maximum(self.bounds[:, 2] - self.bounds[:, 0], self.bounds[:, 3] - self.bounds[:, 1])
+        self.levels = {}
+        for zoom in SIMPLIFICATION_ZOOMS:
+            tolerance = zoom_tolerance(zoom)
+            self.levels[zoom] = {
+                i: douglas_peucker(line, tolerance)
+                for i, line in enumerate(self.full) if extents[i] >= tolerance
+            }
+
+    def geometry(self, zoom: int | None = None, min_lon: float | None = None, min_lat: float | None = None,
+                 max_lon: float | None = None, max_lat: float | None = None) -> dict:
+        """
+        GeoJSON FeatureCollection of the road polylines simplified for `zoom` (the closest precomputed
+        level not finer than needed, full resolution beyond the deepest level), optionally only those
+        whose bounding box intersects the viewport.
+        """
+        lines = dict(enumerate(self.full))
+        if zoom is not None and zoom <= SIMPLIFICATION_ZOOMS[-1]:
+            level = max((z for z in SIMPLIFICATION_ZOOMS if z <= zoom), default=SIMPLIFICATION_ZOOMS[0])
+            lines = self.levels[level]
+
+        selected = list(lines)
+        if None not in (min_lon, min_lat, max_lon, max_lat):
+            b = self.bounds
+            in_view = (b[:, 0] <= max_lon) & (b[:, 2] >= min_lon) & (b[:, 1] <= max_lat) & (b[:, 3] >= min_lat)
+            selected = [i for i in selected if in_view[i]]
+
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "LineString", "coordinates": np.round(lines[i], 6).tolist()},
+                    "properties": {"num_vertices": len(lines[i]), "full_num_vertices": len(self.full[i])},
+                }
+                for i in selected
+            ],
+        }
+
+
+async def build_road_network(driver: AsyncDriver) -> RoadNetwork:
+    place_query = "MATCH (rp:ROADMAP_PLACE) RETURN rp.id as id, rp.longitude as lon, rp.latitude as lat"
+    route_query = "MATCH (a:ROADMAP_PLACE)-[:ROUTE]->(b:ROADMAP_PLACE) RETURN a.id as source, b.id as target"
+    async with asyncio.TaskGroup() as tg:
+        t1 = tg.create_task(query_and_results(driver, place_query, cache=False))
+        t2 = tg.create_task(query_and_results(driver, route_query, cache=False))
+
+    coordinates = {r["id"]: (r["lon"], r["lat"]) for r in t1.result() if r["lon"] is not None and r["lat"] is not None}
+    routes = [(r["source"], r["target"]) for r in t2.result()]
+    network = RoadNetwork(coordinates, routes)
+    print(f"Built road network with {len(network.full)} strokes from {len(routes)} routes")
+    return network
+
+
+road_network = LazyIndex("road-network", build_road_network)
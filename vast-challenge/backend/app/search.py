@@ -0,0 +1,259 @@
+import asyncio
+import heapq
+import re
+from collections import defaultdict
+
+from neo4j import AsyncDriver
+
+from .crud import query_and_results
+from .utils import LazyIndex, in_dataset
+
+# how much a token hit counts depending on the field it was found in
+FIELD_WEIGHTS = {
+    "id": 3.0,
+    "name": 3.0,
+    "title": 2.0,
+    "topic": 2.0,
+    "reason": 1.0,
+}
+
+# how much a token hit counts depending on how it was matched
+MATCH_WEIGHTS = {
+    "exact": 1.0,
+    "prefix": 0.75,
+    "fuzzy": 0.5,
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> list[str]:
+    """Lowercases the text and splits it on everything that is not a letter or digit."""
+    if text is None:
+        return []
+    return _TOKEN_PATTERN.findall(str(text).lower())
+
+
+class _TrieNode:
+    __slots__ = ("children", "token")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.token: str | None = None
+
+
+class PrefixTrie:
+    """Character trie over the index vocabulary, used for prefix and fuzzy token lookups."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def insert(self, token: str):
+        node = self.root
+        for char in token:
+            node = node.children.setdefault(char, _TrieNode())
+        node.token = token
+
+    def with_prefix(self, prefix: str, limit: int = 200) -> list[str]:
+        """Returns up to `limit` vocabulary tokens starting with `prefix`, shortest first."""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        tokens = []
+        queue = [node]
+        while queue and len(tokens) < limit:  # breadth first -> shorter completions first
+            next_queue = []
+            for current in queue:
+                if current.token is not None:
+                    tokens.append(current.token)
+                next_queue.extend(current.children.values())
+            queue = next_queue
+        return tokens[:limit]
+
+    def within_distance(self, word: str, max_distance: int) -> list[tuple[str, int]]:
+        """
+        Returns all vocabulary tokens whose Levenshtein distance to `word` is at most `max_distance`.
+        The dynamic programming rows are shared along trie paths, and branches are pruned
+        as soon as the smallest value of a row exceeds the distance budget.
+        """
+        matches = []
+        first_row = list(range(len(word) + 1))
+
+        def _walk(node: _TrieNode, char: str, previous_row: list[int]):
+            row = [previous_row[0] + 1]
+            for i in range(1, len(word) + 1):
+                row.append(min(
+                    row[i - 1] + 1,
+                    previous_row[i] + 1,
+                    previous_row[i - 1] + (word[i - 1] != char),
+                ))
+            if node.token is not None and row[-1] <= max_distance:
+                matches.append((node.token, row[-1]))
+            if min(row) <= max_distance:
+                for next_char, child in node.children.items():
+                    _walk(child, next_char, row)
+
+        for char, child in self.root.children.items():
+            _walk(child, char, first_row)
+        return matches
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over graph nodes for typeahead search.
+
+    Every indexed node is a document. Tokens of its id, name and title/topic fields as well as of the
+    `reason` texts of its PARTICIPANT relationships point to the document with a field specific weight.
+    A prefix trie over the vocabulary resolves prefix and fuzzy matches to posting lists.
+    """
+
+    def __init__(self):
+        self.documents: list[dict] = []
+        self._doc_by_id: dict = {}
+        self._masks: list[int] = []
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self.trie = PrefixTrie()
+
+    def add_document(self, node_id, label: str, name: str | None, in_graph: list[str], in_graph_mask: int) -> int:
+        if node_id in self._doc_by_id:
+            return self._doc_by_id[node_id]
+        doc_idx = len(self.documents)
+        self.documents.append({
+            "id": node_id,
+            "label": label,
+            "name": name,
+            "in_graph": in_graph or [],
+        })
+        self._masks.append(in_graph_mask or 0)
+        self._doc_by_id[node_id] = doc_idx
+        self.add_field(doc_idx, "id", node_id)
+        return doc_idx
+
+    def add_field(self, doc_idx: int, field: str, text):
+        weight = FIELD_WEIGHTS[field]
+        for token in set(tokenize(text)):
+            postings = self.postings[token]
+            if not postings:
+                self.trie.insert(token)
+            postings[doc_idx] = max(postings.get(doc_idx, 0.0), weight)
+
+    def doc_idx(self, node_id) -> int | None:
+        return self._doc_by_id.get(node_id)
+
+    def _candidate_tokens(self, token: str, prefix: bool, fuzzy: bool) -> list[tuple[str, float]]:
+        candidates = {}
+        if token in self.postings:
+            candidates[token] = MATCH_WEIGHTS["exact"]
+        if prefix:
+            for completion in self.trie.with_prefix(token):
+                candidates.setdefault(completion, MATCH_WEIGHTS["prefix"])
+        if fuzzy and len(token) > 2:
+            max_distance = 1 if len(token) < 6 else 2
+            for match, distance in self.trie.within_distance(token, max_distance):
+                candidates.setdefault(match, MATCH_WEIGHTS["fuzzy"] / distance if distance else MATCH_WEIGHTS["exact"])
+        return list(candidates.items())
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        labels: list[str] | None = None,
+        dataset: str | None = None,
+        fuzzy: bool = False,
+    ) -> list[dict]:
+        """
+        Rank documents matching all query tokens and return the best `k`.
+
+        Args:
+            query (str): Free text; the last token is additionally matched as a prefix (typeahead).
+            k (int): Maximum number of hits to return.
+            labels (list[str] | None): Only return nodes with one of these labels.
+            dataset (str | None): Only return nodes that are contained in this dataset.
+            fuzzy (bool): Also match tokens within a small edit distance.
+
+        Returns:
+            list[dict]: Matching nodes with their `score`, best scores first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores: dict[int, float] | None = None
+        for position, token in enumerate(tokens):
+            is_last = position == len(tokens) - 1
+            token_scores = defaultdict(float)
+            for candidate, match_weight in self._candidate_tokens(token, prefix=is_last, fuzzy=fuzzy):
+                for doc_idx, field_weight in self.postings[candidate].items():
+                    token_scores[doc_idx] = max(token_scores[doc_idx], match_weight * field_weight)
+            # every query token has to match (AND semantics)
+            if scores is None:
+                scores = dict(token_scores)
+            else:
+                scores = {doc_idx: score + token_scores[doc_idx]
+                          for doc_idx, score in scores.items() if doc_idx in token_scores}
+            if not scores:
+                return []
+
+        def _accept(doc_idx: int) -> bool:
+            if labels and self.documents[doc_idx]["label"] not in labels:
+                return False
+            if dataset and not in_dataset(self._masks[doc_idx], dataset):
+                return False
+            return True
+
+        normalized_query = query.strip().lower()
+        ranked = []
+        for doc_idx, score in scores.items():
+            if not _accept(doc_idx):
+                continue
+            doc = self.documents[doc_idx]
+            if str(doc["id"]).lower() == normalized_query or (doc["name"] or "").lower() == normalized_query:
+                score += FIELD_WEIGHTS["id"]
+            ranked.append((score, -doc_idx, doc_idx))
+
+        return [
+            {**self.documents[doc_idx], "score": round(score, 3)}
+            for score, _, doc_idx in heapq.nlargest(k, ranked)
+        ]
+
+
+async def build_search_index(driver: AsyncDriver) -> SearchIndex:
+    """Builds the search index from all nodes except ROADMAP_PLACE and from all PARTICIPANT reasons."""
+    node_query = """
+        MATCH (n) WHERE NOT n:ROADMAP_PLACE
+        RETURN n.id as id, labels(n)[0] as label, n.in_graph as in_graph, n.in_graph_mask as in_graph_mask,
+            coalesce(n.name, n.label) as name,
+            [x IN [n.short_title, n.long_title, n.plan_type] WHERE x IS NOT NULL] as titles,
+            [x IN [n.short_topic, n.long_topic] WHERE x IS NOT NULL] as topics
+    """
+    participation_query = """
+        MATCH (pd:PLAN | DISCUSSION)-[p:PARTICIPANT]-(e:ENTITY_PERSON | ENTITY_ORGANIZATION)
+        WHERE p.reason IS NOT NULL
+        RETURN pd.id as activity_id, e.id as entity_id, p.reason as reason
+    """
+    async with asyncio.TaskGroup() as tg:
+        t1 = tg.create_task(query_and_results(driver, node_query, cache=False))
+        t2 = tg.create_task(query_and_results(driver, participation_query, cache=False))
+
+    index = SearchIndex()
+    for row in t1.result():
+        doc_idx = index.add_document(row["id"], row["label"], row["name"], row["in_graph"], row["in_graph_mask"])
+        index.add_field(doc_idx, "name", row["name"])
+        for title in row["titles"]:
+            index.add_field(doc_idx, "title", title)
+        for topic in row["topics"]:
+            index.add_field(doc_idx, "topic", topic)
+
+    for row in t2.result():
+        for node_id in (row["activity_id"], row["entity_id"]):
+            doc_idx = index.doc_idx(node_id)
+            if doc_idx is not None:
+                index.add_field(doc_idx, "reason", row["reason"])
+
+    print(f"Built search index with {len(index.documents)} documents and {len(index.postings)} tokens")
+    return index
+
+
+search_index = LazyIndex("search", build_search_index)
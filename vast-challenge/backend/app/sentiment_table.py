@@ -0,0 +1,372 @@
+from functools import cached_property
+from itertools import combinations
+from typing import Literal
+
+import numpy as np
+from neo4j import AsyncDriver
+
+from .crud import query_and_results
+from .utils import DATASET_BITS, LazyIndex, dataset_category, masks_matching, meeting_number
+
+StanceLevel = Literal["topic", "industry"]
+Polarity = Literal["positive", "negative", "neutral", "none"]
+CubeDimension = Literal["entity", "entity_type", "topic", "industry", "polarity", "dataset"]
+CUBE_DIMENSIONS: tuple[str, ...] = CubeDimension.__args__
+
+
+def _codes(values: list) -> tuple[list, np.ndarray]:
+    """Dictionary encodes values: returns the distinct values (in order of appearance) and one code per value."""
+    lookup = {}
+    codes = np.array([lookup.setdefault(v, len(lookup)) for v in values], dtype=np.int32)
+    return list(lookup), codes
+
+
+class SentimentTable:
+    """
+    Columnar in-memory copy of the participation table: one row per PARTICIPANT relationship of a
+    person or organization in a PLAN/DISCUSSION about a topic.
+
+    Categorical columns are dictionary encoded (`entities`/`entity_codes`, `topics`/`topic_codes`, ...),
+    dataset membership and industries are stored as bitmasks (`membership`, `industry_mask`),
+    missing sentiments as NaN. `meetings` holds the sequence number of the meeting the activity is part of
+    (-1 if unknown), `meeting_order` the rows sorted by it for meeting window lookups.
+    """
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.entities, self.entity_codes = _codes([r["entity_id"] for r in rows])
+        self.entity_types = {r["entity_id"]: r["entity_type"] for r in rows}
+        self.entity_type_values, self.entity_type_codes = _codes([r["entity_type"] for r in rows])
+        self.topics, self.topic_codes = _codes([r["topic_id"] for r in rows])
+        self.sentiment = np.array([np.nan if r["sentiment"] is None else r["sentiment"] for r in rows], dtype=float)
+        self.membership = np.array([r["in_graph_mask"] or 0 for r in rows], dtype=np.int8)
+        industries = sorted({i for r in rows for i in r["industry"]})
+        self.industries = industries
+        self.industry_bits = {industry: 1 << i for i, industry in enumerate(industries)}
+        self.industry_mask = np.array(
+            [sum(self.industry_bits[i] for i in set(r["industry"])) for r in rows], dtype=np.int32)
+        self.meetings = np.array([-1 if r["meeting"] is None else r["meeting"] for r in rows], dtype=np.int32)
+        self.meeting_order = np.argsort(self.meetings, kind="stable")
+        self.sorted_meetings = self.meetings[self.meeting_order]
+        self.polarity = np.select(
+            [np.isnan(self.sentiment), self.sentiment > 0, self.sentiment < 0],
+            ["none", "positive", "negative"], default="neutral")
+        self._vectors: dict[tuple, dict] = {}
+        self._build_value_masks()
+
+    def _build_value_masks(self):
+        """Precomputes one boolean row mask per value of the low cardinality filter columns."""
+        self.value_masks = {
+            "entity_type": {v: self.entity_type_codes == i for i, v in enumerate(self.entity_type_values)},
+            "topic": {v: self.topic_codes == i for i, v in enumerate(self.topics)},
+            "industry": {v: (self.industry_mask & bit) > 0 for v, bit in self.industry_bits.items()},
+            "polarity": {v: self.polarity == v for v in ("positive", "negative", "neutral", "none")},
+            "dataset": {v: (self.membership & bit) > 0 for v, bit in DATASET_BITS.items()},
+        }
+
+    def _any_of(self, column: str, values: list) -> np.ndarray:
+        masks = self.value_masks[column]
+        result = np.zeros(len(self), dtype=bool)
+        for value in values:
+            if value in masks:
+                result |= masks[value]
+        return result
+
+    def filter(
+        self,
+        entity_types: list[str] | None = None,
+        entity_ids: list | None = None,
+        topics: list[str] | None = None,
+        industries: list[str] | None = None,
+        polarities: list[Polarity] | None = None,
+        min_sentiment: float | None = None,
+        max_sentiment: float | None = None,
+        datasets: list[str] | None = None,
+        exclude_datasets: list[str] | None = None,
+        from_meeting: int | None = None,
+        to_meeting: int | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> dict:
+        """
+        Filters the table by AND-combining one precomputed boolean mask per given filter (values
+        within a filter are OR-combined) and returns the matching rows and facet counts.
+
+        Facet counts of a column are computed with all filters except the one on that column, so they
+        tell how many rows each alternative value would match. `datasets` requires all of the given
+        datasets, `exclude_datasets` none of them. `from_meeting`/`to_meeting` are inclusive bounds on the
+        meeting number; rows of activities without a meeting never match a meeting window.
+        """
+        filters = {}
+        if entity_types:
+            filters["entity_type"] = self._any_of("entity_type", entity_types)
+        if entity_ids:
+            wanted = set(entity_ids)
+            codes = [i for i, e in enumerate(self.entities) if e in wanted]
+            filters["entity"] = np.isin(self.entity_codes, codes)
+        if topics:
+            filters["topic"] = self._any_of("topic", topics)
+        if industries:
+            filters["industry"] = self._any_of("industry", industries)
+        if polarities:
+            filters["polarity"] = self._any_of("polarity", polarities)
+        if min_sentiment is not None or max_sentiment is not None:
+            with np.errstate(invalid="ignore"):
+                filters["sentiment"] = (
+                    (self.sentiment >= (min_sentiment if min_sentiment is not None else -np.inf))
+                    & (self.sentiment <= (max_sentiment if max_sentiment is not None else np.inf))
+                )
+        if datasets or exclude_datasets:
+            filters["dataset"] = np.isin(self.membership, masks_matching(datasets or [], exclude_datasets or []))
+        if from_meeting is not None or to_meeting is not None:
+            filters["meeting"] = self.meeting_window(from_meeting, to_meeting)
+
+        def _combine(skip: str | None = None) -> np.ndarray:
+            mask = np.ones(len(self), dtype=bool)
+            for column, column_mask in filters.items():
+                if column != skip:
+                    mask &= column_mask
+            return mask
+
+        matching = _combine()
+        facets = {}
+        for column, value_masks in self.value_masks.items():
+            facet_rows = _combine(skip=column) if column in filters else matching
+            facets[column] = {
+                value: int(np.count_nonzero(facet_rows & value_mask)) for value, value_mask in value_masks.items()
+            }
+
+        idxs = np.flatnonzero(matching)
+        page = idxs[offset:None if limit is None else offset + limit]
+        return {
+            "total": len(idxs),
+            "rows": [self.row(i) for i in page],
+            "facets": facets,
+        }
+
+    def row(self, idx: int) -> dict:
+        r = self.rows[idx]
+        return {
+            "entity_id": r["entity_id"],
+            "entity_type": r["entity_type"],
+            "topic_id": r["topic_id"],
+            "activity_id": r["activity_id"],
+            "activity_type": r["activity_type"],
+            "sentiment": None if np.isnan(self.sentiment[idx]) else float(self.sentiment[idx]),
+            "reason": r["reason"],
+            "in_graph": [d for d, bit in DATASET_BITS.items() if self.membership[idx] & bit],
+            "industry": r["industry"],
+            "meeting": r["meeting"],
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    @cached_property
+    def cube(self) -> "SentimentCube":
+        return SentimentCube(self)
+
+    def meeting_window(self, from_meeting: int | None = None, to_meeting: int | None = None) -> np.ndarray:
+        """
+        Row mask of the rows within the inclusive meeting window, from two binary searches on the sorted meetings.
+        Rows of unknown meeting (-1) are left out of any window (see `in_meeting_window`).
+        """
+        start = np.searchsorted(self.sorted_meetings, 0 if from_meeting is None else max(from_meeting, 0), side="left")
+        end = len(self) if to_meeting is None else np.searchsorted(self.sorted_meetings, to_meeting, side="right")
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.meeting_order[start:end]] = True
+        return mask
+
+    def dataset_mask(self, dataset: str | None) -> np.ndarray:
+        if dataset is None:
+            return np.ones(len(self), dtype=bool)
+        return (self.membership & DATASET_BITS[dataset]) > 0
+
+    def stance_vectors(self, level: StanceLevel, dataset: str | None = None) -> dict:
+        """
+        Entity x dimension (topic or industry) matrix of mean sentiments, cached per (level, dataset).
+
+        Missing values are kept as a separate 0/1 matrix `observed` while `values` holds 0 in their place,
+        so that NaN-masked cosine similarities against all entities reduce to matrix-vector products.
+        `squared` is cached as well as it is needed for the masked norms.
+        """
+        key = (level, dataset)
+        if key not in self._vectors:
+            rows = self.dataset_mask(dataset) & ~np.isnan(self.sentiment)
+            sums = np.zeros((len(self.entities), len(self.topics if level == "topic" else self.industries)))
+            counts = np.zeros_like(sums)
+            if level == "topic":
+                np.add.at(sums, (self.entity_codes[rows], self.topic_codes[rows]), self.sentiment[rows])
+                np.add.at(counts, (self.entity_codes[rows], self.topic_codes[rows]), 1)
+            else:
+                for column, bit in enumerate(self.industry_bits.values()):
+                    industry_rows = rows & ((self.industry_mask & bit) > 0)
+                    np.add.at(sums[:, column], self.entity_codes[industry_rows], self.sentiment[industry_rows])
+                    np.add.at(counts[:, column], self.entity_codes[industry_rows], 1)
+            observed = (counts > 0).astype(float)
+            values = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+            self._vectors[key] = {"values": values, "squared": values ** 2, "observed": observed}
+        return self._vectors[key]
+
+    def similar_stances(self, entity_id, k: int = 10, level: StanceLevel = "topic",
+                        dataset: str | None = None, min_overlap: int = 2) -> list[dict]:
+        """
+        The `k` entities whose stance vectors are most similar to the one of `entity_id`.
+
+        Uses the same measure as `cosine_similarity_with_nans`: the cosine similarity over the dimensions
+        both entities have sentiments for. Entities sharing fewer than `min_overlap` dimensions are excluded.
+        """
+        vectors = self.stance_vectors(level, dataset)
+        try:
+            idx = self.entities.index(entity_id)
+        except ValueError:
+            raise KeyError(entity_id)
+        query, query_observed = vectors["values"][idx], vectors["observed"][idx]
+
+        dots = vectors["values"] @ query
+        norms = np.sqrt((vectors["squared"] @ query_observed) * (vectors["observed"] @ query ** 2))
+        overlap = vectors["observed"] @ query_observed
+        with np.errstate(invalid="ignore", divide="ignore"):
+            similarity = np.where(norms > 0, dots / norms, np.nan)
+
+        candidates = (overlap >= max(min_overlap, 1)) & ~np.isnan(similarity)
+        candidates[idx] = False
+        ranked = np.flatnonzero(candidates)
+        ranked = ranked[np.argsort(-similarity[ranked], kind="stable")][:k]
+        return [
+            {
+                "entity_id": self.entities[i],
+                "entity_type": self.entity_types[self.entities[i]],
+                "similarity": round(float(similarity[i]), 4),
+                "overlap": int(overlap[i]),
+            }
+            for i in ranked
+        ]
+
+
+class SentimentCube:
+    """
+    Pre-aggregated sentiment cube over the dimensions `entity`, `entity_type`, `topic`, `industry`,
+    `polarity` and `dataset`.
+
+    The base cells aggregate the participation rows at the finest granularity (rows are counted once
+    per industry of their topic, like in `/industry-pro-contra-sentiments`; `dataset` is the exclusive
+    category all/tr/fi/jo). The roll-ups for every subset of dimensions are materialized at construction,
+    so unfiltered group-bys are lookups; filtered ones aggregate the (few) matching base cells.
+    """
+
+    def __init__(self, table: SentimentTable):
+        self.table = table
+        row_idx, industry_values = [], []
+        for i, row in enumerate(table.rows):
+            for industry in set(row["industry"]):
+                row_idx.append(i)
+                industry_values.append(industry)
+        row_idx = np.array(row_idx, dtype=int)
+
+        columns = {
+            "entity": [table.entities[c] for c in table.entity_codes[row_idx]],
+            "entity_type": [table.entity_type_values[c] for c in table.entity_type_codes[row_idx]],
+            "topic": [table.topics[c] for c in table.topic_codes[row_idx]],
+            "industry": industry_values,
+            "polarity": table.polarity[row_idx].tolist(),
+            "dataset": [dataset_category(int(m)) for m in table.membership[row_idx]],
+        }
+        self.values, codes = {}, []
+        for dim in CUBE_DIMENSIONS:
+            self.values[dim], dim_codes = _codes(columns[dim])
+            codes.append(dim_codes)
+        codes = np.stack(codes, axis=1)
+
+        cells, cell_of_row = np.unique(codes, axis=0, return_inverse=True)
+        cell_of_row = cell_of_row.ravel()
+        sentiment = table.sentiment[row_idx]
+        observed = ~np.isnan(sentiment)
+        self.cells = cells
+        self.cell_sum = np.bincount(cell_of_row, weights=np.where(observed, sentiment, 0), minlength=len(cells))
+        self.cell_count = np.bincount(cell_of_row, weights=observed, minlength=len(cells))
+        self.cell_rows = np.bincount(cell_of_row, minlength=len(cells))
+        order = np.argsort(cell_of_row, kind="stable")
+        self.cell_members = np.split(row_idx[order], np.cumsum(self.cell_rows)[:-1])
+
+        self.rollups = {
+            dims: self._rollup(dims, np.arange(len(cells)))
+            for size in range(len(CUBE_DIMENSIONS) + 1)
+            for dims in combinations(CUBE_DIMENSIONS, size)
+        }
+
+    def _rollup(self, dims: tuple[str, ...], cell_idxs: np.ndarray) -> dict:
+        columns = [CUBE_DIMENSIONS.index(d) for d in dims]
+        if len(cell_idxs) == 0:
+            groups, group_of_cell = np.empty((0, len(columns)), dtype=int), np.empty(0, dtype=int)
+        else:
+            groups, group_of_cell = np.unique(self.cells[cell_idxs][:, columns], axis=0, return_inverse=True)
+            group_of_cell = group_of_cell.ravel()
+        return {
+            "groups": groups,
+            "group_of_cell": group_of_cell,
+            "cell_idxs": cell_idxs,
+            "sum": np.bincount(group_of_cell, weights=self.cell_sum[cell_idxs], minlength=len(groups)),
+            "count": np.bincount(group_of_cell, weights=self.cell_count[cell_idxs], minlength=len(groups)),
+            "rows": np.bincount(group_of_cell, weights=self.cell_rows[cell_idxs], minlength=len(groups)),
+        }
+
+    def group_by(self, dims: list[str], filters: dict[str, list] | None = None, drill_through: bool = False) -> list[dict]:
+        """
+        Sum, mean and count of the sentiments per combination of values of `dims` (in cube dimension order),
+        only over base cells matching `filters` (dimension -> accepted values).
+        `count` is the number of recorded sentiments, `num_rows` includes rows without sentiment.
+        With `drill_through` each group also lists its contributing participation rows.
+        """
+        dims = tuple(d for d in CUBE_DIMENSIONS if d in dims)
+        filters = {d: v for d, v in (filters or {}).items() if v}
+        if filters:
+            selected = np.ones(len(self.cells), dtype=bool)
+            for dim, accepted in filters.items():
+                accepted_codes = [i for i, v in enumerate(self.values[dim]) if v in accepted]
+                selected &= np.isin(self.cells[:, CUBE_DIMENSIONS.index(dim)], accepted_codes)
+            rollup = self._rollup(dims, np.flatnonzero(selected))
+        else:
+            rollup = self.rollups[dims]
+
+        results = []
+        for g, group in enumerate(rollup["groups"]):
+            count = rollup["count"][g]
+            result = {dim: self.values[dim][code] for dim, code in zip(dims, group)}
+            result.update({
+                "sum": float(rollup["sum"][g]),
+                "mean": float(rollup["sum"][g] / count) if count else None,
+                "count": int(count),
+                "num_rows": int(rollup["rows"][g]),
+            })
+            if drill_through:
+                cells = rollup["cell_idxs"][rollup["group_of_cell"] == g]
+                members = np.unique(np.concatenate([self.cell_members[c] for c in cells]))
+                result["rows"] = [self.table.row(i) for i in members]
+            results.append(result)
+        return results
+
+
+async def build_sentiment_table(driver: AsyncDriver) -> SentimentTable:
+    query = """
+        MATCH (t:TOPIC)--(pd:PLAN | DISCUSSION)-[p:PARTICIPANT]-(e:ENTITY_PERSON | ENTITY_ORGANIZATION)
+        OPTIONAL MATCH (pd)-[:PART_OF]-(m:MEETING)
+        WITH t, pd, p, e, collect(m.id) as meetings
+        RETURN e.id as entity_id, labels(e)[0] as entity_type, t.id as topic_id,
+            pd.id as activity_id, labels(pd)[0] as activity_type,
+            p.sentiment as sentiment, p.reason as reason, p.in_graph_mask as in_graph_mask,
+            CASE WHEN p.industry IS NULL OR p.industry = [] THEN ['misc'] ELSE p.industry END as industry,
+            meetings
+    """
+    records = await query_and_results(driver, query, cache=False)
+    rows = []
+    for record in records:
+        row = dict(record)
+        numbers = [n for n in map(meeting_number, row.pop("meetings")) if n is not None]
+        rows.append({**row, "meeting": min(numbers, default=None)})
+    table = SentimentTable(rows)
+    print(f"Built sentiment table with {len(table)} rows")
+    return table
+
+
+sentiment_table = LazyIndex("sentiment-table", build_sentiment_table)
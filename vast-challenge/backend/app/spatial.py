@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import math
+from collections import defaultdict
+
+import numpy as np
+from neo4j import AsyncDriver
+
+from .crud import query_and_results
+from .utils import LazyIndex
+
+EARTH_RADIUS_M = 6_371_000
+
+
+def haversine_m(lon: float, lat: float, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Great-circle distances in meters from one point to many points."""
+    lon, lat, lons, lats = map(np.radians, (lon, lat, lons, lats))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class SpatialIndex:
+    """
+    Uniform grid index over PLACE and ROADMAP_PLACE coordinates.
+
+    Points are bucketed into square cells of `cell_size` degrees. Viewport and radius queries only
+    look at the cells overlapping the query rectangle, nearest-k queries search rings of cells
+    around the query point until no closer point can exist.
+    Clusterings per zoom level are computed on first request and kept.
+    """
+
+    def __init__(self, points: list[dict], cell_size: float = 0.01):
+        self.points = points
+        self.cell_size = cell_size
+        self.lons = np.array([p["lon"] for p in points], dtype=float)
+        self.lats = np.array([p["lat"] for p in points], dtype=float)
+        self.kinds = np.array([p["kind"] for p in points])
+        cells = defaultdict(list)
+        for idx, key in enumerate(zip(self._cell(self.lons), self._cell(self.lats))):
+            cells[key].append(idx)
+        self.cells = {key: np.array(idxs) for key, idxs in cells.items()}
+        self._clusters: dict[int, list[dict]] = {}
+
+    def _cell(self, values):
+        return np.floor(np.asarray(values) / self.cell_size).astype(int)
+
+    def _candidates(self, min_lon, min_lat, max_lon, max_lat) -> np.ndarray:
+        cx0, cx1 = self._cell([min_lon, max_lon])
+        cy0, cy1 = self._cell([min_lat, max_lat])
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            keys = [key for key in self.cells if cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1]
+        else:
+            keys = [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if (cx, cy) in self.cells]
+        if not keys:
+            return np.empty(0, dtype=int)
+        return np.concatenate([self.cells[key] for key in keys])
+
+    def _kind_mask(self, idxs: np.ndarray, kinds: list[str] | None) -> np.ndarray:
+        if not kinds:
+            return np.ones(len(idxs), dtype=bool)
+        return np.isin(self.kinds[idxs], kinds)
+
+    def bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+             kinds: list[str] | None = None, limit: int | None = None) -> list[dict]:
+        idxs = self._candidates(min_lon, min_lat, max_lon, max_lat)
+        lons, lats = self.lons[idxs], self.lats[idxs]
+        mask = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+        idxs = idxs[mask & self._kind_mask(idxs, kinds)]
+        return [self.points[i] for i in idxs[:limit]]
+
+    def radius(self, lon: float, lat: float, radius_m: float, kinds: list[str] | None = None) -> list[dict]:
+        d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        idxs = self._candidates(lon - d_lon, lat - d_lat, lon + d_lon, lat + d_lat)
+        idxs = idxs[self._kind_mask(idxs, kinds)]
+        distances = haversine_m(lon, lat, self.lons[idxs], self.lats[idxs])
+        order = np.argsort(distances)
+        return [
+            {**self.points[idxs[i]], "distance_m": round(float(distances[i]), 1)}
+            for i in order if distances[i] <= radius_m
+        ]
+
+    def nearest(self, lon: float, lat: float, k: int, kinds: list[str] | None = None) -> list[dict]:
+        cx, cy = self._cell(lon), self._cell(lat)
+        max_ring = max(
+            max(abs(key[0] - cx), abs(key[1] - cy)) for key in self.cells
+        ) if self.cells else 0
+        best: list[tuple[float, int]] = []  # max-heap of the k best (negated distances)
+        # a ring of cells r steps away only contains points at least (r - 1) cells away
+        meters_per_cell = math.radians(self.cell_size) * EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)
+        for ring in range(max_ring + 1):
+            if len(best) == k and (ring - 1) * meters_per_cell > -best[0][0]:
+                break
+            keys = [
+                (cx + dx, cy + dy)
+                for dx in range(-ring, ring + 1) for dy in range(-ring, ring + 1)
+                if max(abs(dx), abs(dy)) == ring and (cx + dx, cy + dy) in self.cells
+            ]
+            if not keys:
+                continue
+            idxs = np.concatenate([self.cells[key] for key in keys])
+            idxs = idxs[self._kind_mask(idxs, kinds)]
+            for idx, distance in zip(idxs, haversine_m(lon, lat, self.lons[idxs], self.lats[idxs])):
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, idx))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, idx))
+        return [
+            {**self.points[idx], "distance_m": round(float(-neg_distance), 1)}
+            for neg_distance, idx in sorted(best, reverse=True)
+        ]
+
+    def clusters(self, zoom: int, min_lon: float | None = None, min_lat: float | None = None,
+                 max_lon: float | None = None, max_lat: float | None = None) -> list[dict]:
+        """
+        Grid clustering for a web map zoom level: points falling into the same cell of a quarter
+        map tile are merged into one cluster located at their centroid. Singleton clusters are
+        returned as the point itself.
+        """
+        if zoom not in self._clusters:
+            self._clusters[zoom] = self._cluster(zoom)
+        clusters = self._clusters[zoom]
+        if None in (min_lon, min_lat, max_lon, max_lat):
+            return clusters
+        return [
+            c for c in clusters
+            if min_lon <= c["lon"] <= max_lon and min_lat <= c["lat"] <= max_lat
+        ]
+
+    def _cluster(self, zoom: int) -> list[dict]:
+        size = 360 / (2 ** zoom) / 4
+        keys = np.stack([np.floor(self.lons / size), np.floor(self.lats / size)], axis=1)
+        _, labels, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        labels = labels.ravel()
+        lon_sum = np.bincount(labels, weights=self.lons)
+        lat_sum = np.bincount(labels, weights=self.lats)
+        clusters = []
+        members = defaultdict(list)
+        for idx, label in enumerate(labels):
+            members[label].append(idx)
+        for label, count in enumerate(counts):
+            if count == 1:
+                clusters.append({**self.points[members[label][0]], "count": 1})
+                continue
+            kinds, kind_counts = np.unique(self.kinds[members[label]], return_counts=True)
+            clusters.append({
+                "cluster_id": f"{zoom}/{label}",
+                "lon": float(lon_sum[label] / count),
+                "lat": float(lat_sum[label] / count),
+                "count": int(count),
+                "kinds": dict(zip(kinds.tolist(), kind_counts.tolist())),
+            })
+        return clusters
+
+
+async def build_spatial_index(driver: AsyncDriver) -> SpatialIndex:
+    """
+    Collects PLACE and ROADMAP_PLACE points with normalized `lon`/`lat` fields.
+    NOTE: the `lat` property of PLACE nodes holds the longitude and `lon` the latitude
+    (the map view projects `[lat, lon]` accordingly), ROADMAP_PLACE nodes use `longitude`/`latitude`.
+    """
+    place_query = """
+        MATCH (p:PLACE) WHERE p.lat IS NOT NULL AND p.lon IS NOT NULL
+        RETURN p.id as id, p.lat as lon, p.lon as lat, coalesce(p.name, p.label) as name,
+            p.zone as zone, p.zone_detail as zone_detail, p.in_graph as in_graph
+    """
+    roadmap_query = """
+        MATCH (rp:ROADMAP_PLACE) WHERE rp.longitude IS NOT NULL AND rp.latitude IS NOT NULL
+        RETURN rp.id as id, rp.longitude as lon, rp.latitude as lat, rp.city_name as name,
+            rp.zone as zone, null as zone_detail, null as in_graph
+    """
+    async with asyncio.TaskGroup() as tg:
+        t1 = tg.create_task(query_and_results(driver, place_query, cache=False))
+        t2 = tg.create_task(query_and_results(driver, roadmap_query, cache=False))
+
+    points = [{**dict(record), "kind": "PLACE"} for record in t1.result()]
+    points += [{**dict(record), "kind": "ROADMAP_PLACE"} for record in t2.result()]
+    print(f"Built spatial index with {len(points)} points")
+    return SpatialIndex(points)
+
+
+spatial_index = LazyIndex("spatial", build_spatial_index)
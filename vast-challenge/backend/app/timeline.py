@@ -0,0 +1,175 @@
+import numpy as np
+from neo4j import AsyncDriver
+
+from .sentiment_table import SentimentTable, sentiment_table
+from .utils import DATASET_BITS, LazyIndex, dataset_category, in_dataset
+
+# conditions of `/sentiments-by-industry`: sentiments recorded in the full graph, in TROUT, in FILAH
+INDUSTRY_CONDITIONS = {"full_graph": "jo", "known_in_trout": "tr", "known_in_filah": "fi"}
+
+
+class PrefixSums:
+    """
+    Events at integer times grouped into series (e.g. per entity and industry), sorted by series and time,
+    with the cumulative sums of their weights. The events of every series within a time window are a contiguous
+    slice found by binary search, so the sums of all series over any window cost O(number of series * log n).
+    """
+
+    def __init__(self, series: np.ndarray, times: np.ndarray, weights: dict[str, np.ndarray], num_series: int):
+        times = times.astype(np.int64)
+        self.first = int(times.min()) if len(times) else 0
+        self.span = (int(times.max()) - self.first + 2) if len(times) else 1
+        self.order = np.lexsort((times, series))
+        # series and time combined into one sorted key, so all series are searched in a single call
+        self.keys = series[self.order] * self.span + (times[self.order] - self.first)
+        self.num_series = num_series
+        self.cumulative = {
+            name: np.concatenate([[0], np.cumsum(weight[self.order])]) for name, weight in weights.items()
+        }
+
+    def _offset(self, time: int | None, default: int) -> int:
+        if time is None:
+            return default
+        return int(np.clip(time - self.first, -1, self.span - 1))
+
+    def window(self, start_time: int | None = None, end_time: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Per series the [start, end) positions (in `order`) of its events within the inclusive time window."""
+        offsets = np.arange(self.num_series) * self.span
+        start = np.searchsorted(self.keys, offsets + self._offset(start_time, 0), side="left")
+        end = np.searchsorted(self.keys, offsets + self._offset(end_time, self.span - 2), side="right")
+        return start, np.maximum(start, end)
+
+    def sums(self, name: str, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        return self.cumulative[name][end] - self.cumulative[name][start]
+
+
+def _bounds(from_meeting: int | None, to_meeting: int | None) -> tuple[int | None, int | None]:
+    """Window of meetings as prefix sum times: a bounded window leaves out statements of unknown meeting (-1)."""
+    if from_meeting is None and to_meeting is None:
+        return None, None
+    return (0 if from_meeting is None else max(from_meeting, 0)), to_meeting
+
+
+class SentimentTimeline:
+    """
+    Versions of the entity x industry sentiment aggregations restricted to a window of meetings, from prefix
+    sums. Meetings are the time axis of the sentiments, ordered by their number (see `meeting_number`).
+
+    Events are the sentiment statements the aggregations count (one per distinct entity, topic, sentiment,
+    reason, dataset membership and industries, however many plans/discussions repeat it) at the first meeting
+    they were recorded in, once per industry of the topic. Statements without a sentiment are left out like in
+    the aggregations, an unbounded window therefore reproduces the aggregations over all data. Statements of
+    unknown meeting are only part of the unbounded window.
+    """
+
+    def __init__(self, table: SentimentTable):
+        statements = {}
+        for i, row in enumerate(table.rows):
+            if np.isnan(table.sentiment[i]):
+                continue
+            key = (row["entity_id"], row["topic_id"], row["sentiment"], row["reason"], row["in_graph_mask"],
+                   tuple(row["industry"]))
+            if key not in statements or table.meetings[i] < statements[key][1]:
+                statements[key] = (row, table.meetings[i])
+
+        self.statements = []
+        events = []  # statement, industry
+        for row, first_meeting in statements.values():
+            mask = row["in_graph_mask"]
+            self.statements.append({
+                "entity_id": row["entity_id"],
+                "entity_type": row["entity_type"],
+                "meeting": first_meeting,
+                "topic_sentiment": {
+                    "topic_id": row["topic_id"],
+                    "sentiment": row["sentiment"],
+                    "reason": row["reason"],
+                    "sentiment_recorded_in": [d for d, bit in DATASET_BITS.items() if mask & bit],
+                    "sentiment_mask": mask,
+                    "topic_industry": row["industry"],
+                },
+            })
+            events.extend((len(self.statements) - 1, industry) for industry in row["industry"])
+
+        statement_of_event = np.array([s for s, _ in events], dtype=np.int64)
+        meetings = np.array([self.statements[s]["meeting"] for s in statement_of_event], dtype=np.int64)
+        sentiment = np.array([self.statements[s]["topic_sentiment"]["sentiment"] for s in statement_of_event],
+                             dtype=float)
+        self.statement_of_event = statement_of_event
+
+        # /industry-pro-contra-sentiments: (entity, entity type, positive, dataset category, industry)
+        pro_contra = [
+            (st["entity_id"], st["entity_type"], st["topic_sentiment"]["sentiment"] >= 0,
+             dataset_category(st["topic_sentiment"]["sentiment_mask"]), industry)
+            if st["topic_sentiment"]["sentiment"] != 0 else None
+            for st, industry in ((self.statements[s], industry) for s, industry in events)
+        ]
+        self.pro_contra_keys, pro_contra_series = self._series(pro_contra)
+        nonzero = np.array([key is not None for key in pro_contra], dtype=bool)
+        self.pro_contra = PrefixSums(
+            pro_contra_series[nonzero], meetings[nonzero], {"sentiment": sentiment[nonzero]}, len(self.pro_contra_keys))
+        self.pro_contra_events = np.flatnonzero(nonzero)[self.pro_contra.order]
+
+        # /sentiments-by-industry: (condition, entity, industry)
+        self.entities = list(table.entities)
+        industry_series, event_idxs = [], []
+        lookup = {}
+        for e, (s, industry) in enumerate(events):
+            statement = self.statements[s]
+            for condition, dataset in INDUSTRY_CONDITIONS.items():
+                if in_dataset(statement["topic_sentiment"]["sentiment_mask"], dataset):
+                    key = (condition, statement["entity_id"], industry)
+                    industry_series.append(lookup.setdefault(key, len(lookup)))
+                    event_idxs.append(e)
+        self.industry_keys = list(lookup)
+        event_idxs = np.array(event_idxs, dtype=np.int64)
+        self.by_industry = PrefixSums(
+            np.array(industry_series, dtype=np.int64), meetings[event_idxs],
+            {"sentiment": sentiment[event_idxs], "count": np.ones(len(event_idxs))}, len(self.industry_keys))
+
+    @staticmethod
+    def _series(keys: list) -> tuple[list, np.ndarray]:
+        lookup = {}
+        codes = np.array([-1 if key is None else lookup.setdefault(key, len(lookup)) for key in keys], dtype=np.int64)
+        return list(lookup), codes
+
+    def pro_contra_sentiments(self, from_meeting: int | None = None, to_meeting: int | None = None) -> list[dict]:
+        """`/industry-pro-contra-sentiments` restricted to the statements first recorded within the meeting window."""
+        start, end = self.pro_contra.window(*_bounds(from_meeting, to_meeting))
+        sums = self.pro_contra.sums("sentiment", start, end)
+        keys = ["entity_id", "entity_type", "sentiment_positive", "dataset", "industry"]
+        return [
+            {
+                **dict(zip(keys, self.pro_contra_keys[k])),
+                "agg_sentiment": float(sums[k]),
+                "contributing_sentiments": [
+                    self.statements[self.statement_of_event[e]]["topic_sentiment"]
+                    for e in self.pro_contra_events[start[k]:end[k]]
+                ],
+            }
+            for k in np.flatnonzero(end > start)
+        ]
+
+    def sentiments_by_industry(self, from_meeting: int | None = None, to_meeting: int | None = None) -> dict:
+        """`/sentiments-by-industry` restricted to the statements first recorded within the meeting window."""
+        start, end = self.by_industry.window(*_bounds(from_meeting, to_meeting))
+        sums = self.by_industry.sums("sentiment", start, end)
+        counts = self.by_industry.sums("count", start, end)
+        result = {condition: {entity_id: {} for entity_id in self.entities} for condition in INDUSTRY_CONDITIONS}
+        for k in np.flatnonzero(counts > 0):
+            condition, entity_id, industry = self.industry_keys[k]
+            result[condition][entity_id][industry] = {
+                "mean_sentiment": float(sums[k] / counts[k]),
+                "num_sentiments": int(counts[k]),
+            }
+        return {
+            condition: [{entity_id: industries} for entity_id, industries in entities.items()]
+            for condition, entities in result.items()
+        }
+
+
+async def build_sentiment_timeline(driver: AsyncDriver) -> SentimentTimeline:
+    return SentimentTimeline(await sentiment_table.get(driver))
+
+
+sentiment_timeline = LazyIndex("sentiment-timeline", build_sentiment_timeline)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+from contextvars import ContextVar
+
+# Transaction timeout (seconds) applied to every query if the endpoint has no specific one.
+# Per-endpoint overrides are given as JSON object of path -> seconds, e.g. '{"/graph-skeleton": 60}'.
+DEFAULT_QUERY_TIMEOUT = float(os.getenv('QUERY_TIMEOUT', 30))
+ENDPOINT_QUERY_TIMEOUTS: dict[str, float] = {
+    "/graph-skeleton": 60,
+    "/dataset-specific-nodes-edges": 60,
+    "/search": 10,
+    **json.loads(os.getenv('QUERY_TIMEOUTS', '{}')),
+}
+
+# timeout of the endpoint that is currently being served, read by the query helpers in `crud`
+query_timeout: ContextVar[float | None] = ContextVar("query_timeout", default=DEFAULT_QUERY_TIMEOUT)
+
+
+class QueryTimeout(Exception):
+    """Raised when the database aborted a query because it exceeded its transaction timeout."""
+
+    def __init__(self, query: str, params: dict | None, timeout: float | None):
+        super().__init__(f"Query exceeded its timeout of {timeout}s")
+        self.query = query
+        self.params = params
+        self.timeout = timeout
+
+
+def is_timeout_error(error: Exception) -> bool:
+    return "TransactionTimedOut" in (getattr(error, "code", None) or "")
+
+
+def endpoint_timeout(path: str) -> float | None:
+    return ENDPOINT_QUERY_TIMEOUTS.get(path, DEFAULT_QUERY_TIMEOUT)
+
+
+class QueryTimeoutMiddleware:
+    """
+    ASGI middleware that
+    - sets the transaction timeout of the requested endpoint for all queries run while serving it
+    - cancels the request handler (and with it the running query and transform) when the client
+      disconnects before the response was sent. Only applies to requests without body (GET/HEAD),
+      as waiting for the disconnect consumes the request's receive channel.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = query_timeout.set(endpoint_timeout(scope["path"]))
+        try:
+            if scope["method"] not in ("GET", "HEAD"):
+                return await self.app(scope, receive, send)
+
+            handler = asyncio.ensure_future(self.app(scope, receive, send))
+
+            async def _watch_disconnect():
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        if not handler.done():
+                            print(f"Client disconnected, cancelling {scope['path']}?{scope['query_string'].decode()}")
+                            handler.cancel()
+                        return
+
+            watcher = asyncio.ensure_future(_watch_disconnect())
+            try:
+                await handler
+            except asyncio.CancelledError:
+                if not watcher.done():  # we ourselves are being cancelled, not the client disconnected
+                    handler.cancel()
+                    raise
+            finally:
+                watcher.cancel()
+        finally:
+            query_timeout.reset(token)
@@ -1,11 +1,20 @@
+import asyncio
+import re
 import subprocess
 import sys
 import os
+from typing import Awaitable, Callable, Generic, TypeVar
 from neo4j.time import Date, Time, DateTime
 from neo4j.graph import Node, Relationship
 import numpy as np
 from numpy.linalg import norm
 
+T = TypeVar("T")
+
+# dataset membership (`in_graph`) encoded as bitmask (`in_graph_mask`)
+DATASET_BITS = {"jo": 1, "fi": 2, "tr": 4}
+ALL_DATASETS_MASK = sum(DATASET_BITS.values())
+
 
 def convert(value):
     # https://neo4j.com/docs/api/python-driver/current/types/temporal.html
@@ -51,6 +60,85 @@ def serialize_neo4j_entity(node_or_link: Node | Relationship):
         raise NotImplementedError
 
 
+def membership_mask(in_graph: list[str] | None) -> int:
+    """Encodes a dataset membership list such as `['jo', 'fi']` as bitmask (here 3)."""
+    return sum(DATASET_BITS[dataset] for dataset in set(in_graph or []))
+
+
+def in_dataset(mask: int | None, dataset: str) -> bool:
+    return bool((mask or 0) & DATASET_BITS[dataset])
+
+
+def dataset_category(mask: int) -> str:
+    """
+    Exclusive dataset category of a membership mask as used by the pro/contra aggregations:
+    `all` (in all datasets), `tr` (in TROUT but not FILAH), `fi` (in FILAH but not TROUT), else `jo`.
+    """
+    if mask == ALL_DATASETS_MASK:
+        return 'all'
+    elif in_dataset(mask, 'tr') and not in_dataset(mask, 'fi'):
+        return 'tr'
+    elif in_dataset(mask, 'fi') and not in_dataset(mask, 'tr'):
+        return 'fi'
+    else:
+        return 'jo'
+
+
+def meeting_number(meeting_id: str | None) -> int | None:
+    """
+    Sequence number of a meeting from its id (`Meeting_<n>`). Meetings are ordered by this number: most of
+    them carry their label (e.g. `Meeting 7`) as `date`, only some a calendar date (e.g. `07-03-40`).
+    """
+    if meeting_id is None:
+        return None
+    match = re.fullmatch(r"Meeting_(\d+)", str(meeting_id))
+    return int(match.group(1)) if match else None
+
+
+def in_meeting_window(number: int | None, from_meeting: int | None, to_meeting: int | None) -> bool:
+    """
+    Whether a meeting number lies within an inclusive window of meetings. Activities of unknown meeting
+    (`None`) are only part of the unbounded window.
+    """
+    if from_meeting is None and to_meeting is None:
+        return True
+    return number is not None and (from_meeting is None or number >= from_meeting) \
+        and (to_meeting is None or number <= to_meeting)
+
+
+def masks_matching(include: list[str] = (), exclude: list[str] = ()) -> list[int]:
+    """
+    All membership masks containing every dataset of `include` and none of `exclude`,
+    e.g. for "in fi but not in tr": `n.in_graph_mask IN $masks` with `masks_matching(['fi'], ['tr'])`.
+    """
+    required = membership_mask(include)
+    forbidden = membership_mask(exclude)
+    return [mask for mask in range(1, ALL_DATASETS_MASK + 1) if mask & required == required and not mask & forbidden]
+
+
+async def ensure_membership_masks(driver):
+    """
+    Makes sure every node and relationship with an `in_graph` list also carries the equivalent
+    `in_graph_mask` bitmask (databases loaded before it existed) and that the masks are indexed.
+    """
+    to_mask = " + ".join(
+        f"CASE WHEN '{dataset}' IN x.in_graph THEN {bit} ELSE 0 END" for dataset, bit in DATASET_BITS.items()
+    )
+    await driver.execute_query(f"MATCH (x) WHERE x.in_graph IS NOT NULL AND x.in_graph_mask IS NULL SET x.in_graph_mask = {to_mask}")
+    await driver.execute_query(f"MATCH ()-[x]->() WHERE x.in_graph IS NOT NULL AND x.in_graph_mask IS NULL SET x.in_graph_mask = {to_mask}")
+
+    labels, _, _ = await driver.execute_query("CALL db.labels() YIELD label RETURN label")
+    for record in labels:
+        label = record["label"]
+        await driver.execute_query(
+            f"CREATE INDEX in_graph_mask_{label.lower()} IF NOT EXISTS FOR (n:`{label}`) ON (n.in_graph_mask)")
+    rel_types, _, _ = await driver.execute_query("CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType")
+    for record in rel_types:
+        rel_type = record["relationshipType"]
+        await driver.execute_query(
+            f"CREATE INDEX in_graph_mask_rel_{rel_type.lower()} IF NOT EXISTS FOR ()-[r:`{rel_type}`]-() ON (r.in_graph_mask)")
+
+
 async def is_database_empty(driver):
     """
     Check if the Neo4j database is empty by counting total nodes.
@@ -114,4 +202,27 @@ def cosine_similarity_with_nans(x, y):
         return np.nan
     x_masked = x[mask]
     y_masked = y[mask]
-    return np.dot(x_masked, y_masked) / (norm(x_masked) * norm(y_masked))
\ No newline at end of file
+    return np.dot(x_masked, y_masked) / (norm(x_masked) * norm(y_masked))
+
+
+class LazyIndex(Generic[T]):
+    """
+    Process wide in-memory structure that is built from the database on first use.
+    Concurrent first requests wait for a single build.
+    """
+
+    def __init__(self, name: str, build: Callable[..., Awaitable[T]]):
+        self.name = name
+        self._build = build
+        self._value: T | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, driver) -> T:
+        if self._value is None:
+            async with self._lock:
+                if self._value is None:
+                    self._value = await self._build(driver)
+        return self._value
+
+    def reset(self):
+        self._value = None
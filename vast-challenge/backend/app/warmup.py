@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from .timeouts import endpoint_timeout, query_timeout
+
+# Warm-up of the heavy endpoints and in-memory indexes after startup. Disable with WARMUP=0;
+# WARMUP_STEPS optionally restricts it to a comma separated list of step names.
+WARMUP_ENABLED = os.getenv('WARMUP', '1') not in ('0', 'false')
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 4))
+WARMUP_STEPS = [s.strip() for s in os.getenv('WARMUP_STEPS', '').split(',') if s.strip()]
+
+
+class Warmup:
+    """
+    Runs warm-up steps concurrently, with at most `concurrency` of them at a time, and records the
+    status and duration of every step. A failing step is recorded but does not stop the others.
+
+    `state` is `pending` before the warm-up started, `running` while it runs and `warm` once all steps
+    finished (also if some of them failed, as their endpoints are served anyway). `disabled` if turned off.
+    """
+
+    def __init__(self, enabled: bool = WARMUP_ENABLED, concurrency: int = WARMUP_CONCURRENCY,
+                 only: list[str] | None = None):
+        self.enabled = enabled
+        self.concurrency = concurrency
+        self.only = only if only is not None else WARMUP_STEPS
+        self.state = "pending" if enabled else "disabled"
+        self.started_at: datetime | None = None
+        self.duration_ms: float | None = None
+        self.steps: dict[str, dict] = {}
+
+    @property
+    def is_warm(self) -> bool:
+        return self.state in ("warm", "disabled")
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[Any]], semaphore: asyncio.Semaphore):
+        async with semaphore:
+            step = self.steps[name]
+            step["status"] = "running"
+            # steps named after an endpoint path run with that endpoint's query timeout
+            token = query_timeout.set(endpoint_timeout(name.split('?')[0]))
+            start = time.perf_counter()
+            try:
+                await fn()
+                step["status"] = "done"
+            except Exception as e:
+                step["status"] = "failed"
+                step["error"] = str(e)
+                print(f"Warm-up step {name} failed: {e}")
+            finally:
+                step["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                query_timeout.reset(token)
+
+    async def run(self, steps: dict[str, Callable[[], Awaitable[Any]]]):
+        if not self.enabled:
+            return
+        steps = {name: fn for name, fn in steps.items() if not self.only or name in self.only}
+        self.state = "running"
+        self.started_at = datetime.now()
+        self.steps = {name: {"status": "pending", "duration_ms": None} for name in steps}
+        print(f"Warming up {len(steps)} steps with concurrency {self.concurrency}")
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._step(name, fn, semaphore) for name, fn in steps.items()))
+        self.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.state = "warm"
+        print(f"Warm-up finished in {self.duration_ms}ms")
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "steps": self.steps,
+        }
+
+
+warmup = Warmup()
@@ -4,6 +4,9 @@ import datetime
 from neo4j import GraphDatabase
 import os
 
+from app.graph_analytics import centrality_properties, compute_centralities
+from app.utils import membership_mask
+
 
 def remove_null_vals(elements):
     return [{k: v for k, v in e.items() if v is not None} for e in elements]
@@ -236,6 +239,7 @@ def repair():
          - The function assumes the presence of helper functions such as `load_files`, 
             `missing_attr_entities`, `infer_link_role`, and `link_id`.
          - The `in_graph` attribute is added to track the membership of nodes and links in the original graphs.
+           `in_graph_mask` holds the same membership as bitmask (jo=1, fi=2, tr=4).
     Disclaimer:
          This docstring was generated with the assistance of an AI model and may therefore be inaccurate.
     """
@@ -302,6 +306,10 @@ def repair():
                 all_links[link_id(link)][in_graph_attr] = []
             all_links[link_id(link)][in_graph_attr].append(graph_id)
 
+    # integer encoding of the membership for order independent, indexable comparisons
+    for element in [*all_nodes.values(), *all_links.values()]:
+        element[in_graph_attr + '_mask'] = membership_mask(element[in_graph_attr])
+
     for v in all_nodes.values():
         if 'date' in v:
             if v['date'].startswith("00"):
@@ -322,6 +330,18 @@ def repair():
     return all_nodes, all_links
 
 
+def add_centralities(all_nodes, all_links):
+    """
+    Computes degree, weighted degree, PageRank and betweenness of every node in the full graph and in
+    each dataset view (see `app.graph_analytics`) and adds them to the nodes as properties named
+    `<metric>_<view>`, e.g. `pagerank_fi`. Nodes not in a view have no properties for it.
+    """
+    nodes = [(node_id, node['in_graph_mask']) for node_id, node in all_nodes.items()]
+    edges = [(link['source'], link['target'], link['in_graph_mask']) for link in all_links.values()]
+    for node_id, properties in centrality_properties(compute_centralities(nodes, edges)).items():
+        all_nodes[node_id].update(properties)
+
+
 def to_database(all_nodes, all_links):
     """
     Transfers data into a Neo4j database by creating nodes and relationships 
@@ -413,6 +433,8 @@ def to_database(all_nodes, all_links):
 if __name__ == "__main__":
     check()
 
-    to_database(*repair())
+    all_nodes, all_links = repair()
+    add_centralities(all_nodes, all_links)
+    to_database(all_nodes, all_links)
 
     print("\n\n Data successfully loaded in database.")
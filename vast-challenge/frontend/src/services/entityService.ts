@@ -1,5 +1,5 @@
 import { api } from '../lib/axios.ts'
-import type { Entity, DatasetNodeCount, IndustrySentimentRaw, GraphMembership } from '../types/entity.ts'
+import type { Entity, DatasetNodeCount, DatasetOverlap, IndustrySentimentRaw, GraphMembership } from '../types/entity.ts'
 
 export async function fetchEntity(entityType: Entity): Promise<any> {
   try {
@@ -15,23 +15,42 @@ export async function fetchEntity(entityType: Entity): Promise<any> {
 
 export async function fetchDatasetNodeCounts(datasets: GraphMembership[]): Promise<DatasetNodeCount[]> {
   try {
-    const results: DatasetNodeCount[] = [];
-    for (const dataset of datasets) {
-      const response = await api.get(
-        `/dataset-specific-nodes-edges?dataset=${dataset}`
-      );
-      results.push({
-        dataset: dataset,
-        nodeCount: response.data.nodes.length,
-      });
-    }
-    return results;
+    // nodes only in a dataset (and the journalist's graph which contains everything)
+    const overlap = await fetchDatasetOverlap({ element: ['nodes'] });
+    const totals = overlap.nodes?.totals ?? {};
+    return datasets.map((dataset) => ({
+      dataset: dataset,
+      nodeCount: totals[dataset === 'jo' ? 'jo' : `jo+${dataset}`] ?? 0,
+    }));
   } catch (error) {
     console.error('Error fetching dataset node counts:', error);
     throw error;
   }
 }
 
+/**
+ * Counts of nodes per label and links per relationship type in every dataset membership combination,
+ * with the element ids of every group if `ids` is set.
+ */
+export async function fetchDatasetOverlap(params: {
+  element?: ('nodes' | 'links')[];
+  label?: string[];
+  dataset?: GraphMembership[];
+  exclude_dataset?: GraphMembership[];
+  ids?: boolean;
+} = {}): Promise<DatasetOverlap> {
+  try {
+    const res = await api.get<DatasetOverlap>(`/dataset-overlap`, {
+      params,
+      paramsSerializer: { indexes: null },
+    });
+    return res.data;
+  } catch (error) {
+    console.error('Error fetching dataset overlap:', error);
+    throw error;
+  }
+}
+
 export async function fetchIndustrySentimentBreakdown(): Promise<IndustrySentimentRaw[]> {
   try {
     const response = await api.get('/industry-pro-contra-sentiments');
@@ -89,3 +108,29 @@ export async function fetchTripActivityByPerson(personId: string): Promise<TripA
     throw error;
   }
 }
+
+export interface BatchSubRequest {
+  path: string;
+  params?: Record<string, unknown>;
+}
+
+export interface BatchResult<T = any> {
+  path: string;
+  params: Record<string, unknown>;
+  status: number;
+  body: T;
+}
+
+/**
+ * Executes several GET requests in a single round trip via `/batch`.
+ * Results are returned in request order, each with its own HTTP status.
+ */
+export async function fetchBatch(requests: BatchSubRequest[]): Promise<BatchResult[]> {
+  try {
+    const res = await api.post<BatchResult[]>(`/batch`, { requests });
+    return res.data;
+  } catch (error) {
+    console.error('Error executing batch request:', error);
+    throw error;
+  }
+}
@@ -31,6 +31,19 @@ export interface DatasetNodeCount {
   nodeCount: number;
 }
 
+export interface MembershipGroup {
+  label: string;
+  membership: string;
+  in_graph_mask: number;
+  count: number;
+  ids?: any[];
+}
+
+export interface DatasetOverlap {
+  nodes?: { groups: MembershipGroup[]; totals: Record<string, number> };
+  links?: { groups: MembershipGroup[]; totals: Record<string, number> };
+}
+
 export interface IndustrySentimentRaw {
   industry: string;
   dataset: GraphMembership | 'all';